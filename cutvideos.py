@@ -1,38 +1,47 @@
 import os
 import sys
+import asyncio
+import argparse
 from datetime import datetime
 import logging
-from implementation.shared.config import DATA_PATHS, RESULTS_DIR_VID
-from implementation.cut.rosbag_processing import process_telescope_transforms, process_phantom_transforms
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from implementation.shared.config import DATA_PATHS, RESULTS_DIR_VID, MARKER_FRAME_IDS, USE_PROXY_VIDEOS
+from implementation.cut.rosbag_processing import (
+    extract_markers_transforms,
+    process_telescope_transforms,
+    process_phantom_transforms
+)
 from implementation.cut.video_processing import cut_video_segments
+from implementation.cut.async_pipeline import create_stage_semaphores, cut_video_segments_async, generate_proxies_async
+from implementation.cut.proxies import generate_proxies
+from implementation.cut.generate_table import create_segment_report, add_report_rows, write_segment_report
+from implementation.cut.manifest import (
+    get_manifest_path,
+    collect_trial_inputs,
+    load_manifest,
+    is_trial_up_to_date,
+    start_trial,
+    complete_trial
+)
 import shutil
 
 LOGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-os.makedirs(LOGS_DIR, exist_ok=True)
-current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-print(f"Script started at {current_time}")
-log_filename = f"log_{current_time}.txt"
-log_file_path = os.path.join(LOGS_DIR, log_filename)
-old_stdout = sys.stdout
-old_stderr = sys.stderr
-
-log_file = open(log_file_path, 'a')
-
-sys.stdout = log_file
-sys.stderr = log_file
-
-logging.basicConfig(
-    level=logging.INFO,
-    stream=log_file,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+VIDEO_TYPES = ['Room', 'LapColor', 'AtlasAR']
 
-logging.info("Starting the script")
 
-os.makedirs(RESULTS_DIR_VID, exist_ok=True)
+def prepare_trial(trial_data, summary):
+    """
+    Collects the video and annotation files of a trial and checks its manifest.
 
+    Parameters:
+        trial_data (dict): One entry of DATA_PATHS.
+        summary (dict): Summary of the trial; its 'status' and 'rows' are set when the trial is skipped.
 
-for trial_data in DATA_PATHS:
+    Returns:
+        dict: The trial's 'video_files', 'log_file_paths' and started 'manifest', or None if there is
+            nothing to do for the trial.
+    """
     ROSBAG_DATA_PATH = trial_data['ROSBAG_DATA_PATH']
     VIDEO_DIR = trial_data['VIDEO_DIR']
     LOG_FILE_DIR = trial_data.get('LOG_FILE_DIR')
@@ -44,9 +53,8 @@ for trial_data in DATA_PATHS:
 
     if not os.path.exists(VIDEO_DIR):
         logging.warning(f"Video directory {VIDEO_DIR} does not exist for trial {trial_number}. Skipping trial.")
-        continue
-
-    VIDEO_TYPES = ['Room', 'LapColor', 'AtlasAR']
+        summary['status'] = 'missing videos'
+        return None
 
     VIDEO_FILES = [
     filename for filename in os.listdir(VIDEO_DIR)
@@ -56,57 +64,350 @@ for trial_data in DATA_PATHS:
 
     if not VIDEO_FILES:
         logging.warning(f"No video files found in {VIDEO_DIR} for trial {trial_number}")
-        continue
+        summary['status'] = 'missing videos'
+        return None
 
+    LOG_FILES = []
     if not pretrial and LOG_FILE_DIR and os.path.exists(LOG_FILE_DIR):
         LOG_FILES = [
             filename for filename in os.listdir(LOG_FILE_DIR)
             if os.path.isfile(os.path.join(LOG_FILE_DIR, filename)) and filename.endswith('.log')
         ]
+        LOG_FILE_PATHS = [os.path.join(LOG_FILE_DIR, log_file_name) for log_file_name in LOG_FILES] or None
+    else:
+        LOG_FILE_PATHS = None
+        logging.info(f"No annotations available for trial {trial_number}.")
+
+    trial_inputs = collect_trial_inputs(ROSBAG_DATA_PATH, VIDEO_DIR, VIDEO_FILES, LOG_FILE_DIR, LOG_FILES)
+    manifest = load_manifest(get_manifest_path(RESULTS_DIR_VID, trial_type, trial_number))
+    if is_trial_up_to_date(manifest, trial_inputs):
+        logging.info(f"Trial {trial_number} is up to date. Skipping trial.")
+        summary['status'] = 'up to date'
+        summary['rows'] = manifest['rows']
+        return None
+    start_trial(manifest, trial_inputs)
+    return {'video_files': VIDEO_FILES, 'log_file_paths': LOG_FILE_PATHS, 'manifest': manifest}
+
+
+def detect_trial_segments(trial_data, scratch_dir):
+    """
+    Reads the marker transforms of a trial and detects the segments to cut.
+
+    Parameters:
+        trial_data (dict): One entry of DATA_PATHS.
+        scratch_dir (str): Directory for the trial's intermediate rosbag exports.
+
+    Returns:
+        tuple: (segments_to_cut, segments_of_missing_phantom_transform)
+    """
+    ROSBAG_DATA_PATH = trial_data['ROSBAG_DATA_PATH']
+    marker_transforms = extract_markers_transforms(ROSBAG_DATA_PATH, MARKER_FRAME_IDS, scratch_dir)
+    segments_to_cut = process_telescope_transforms(ROSBAG_DATA_PATH, marker_transforms)
+    segments_of_missing_phantom_transform = process_phantom_transforms(ROSBAG_DATA_PATH, marker_transforms)
+    return segments_to_cut, segments_of_missing_phantom_transform
+
+
+def finish_trial(trial_data, summary, manifest, segment_rows, scratch_dir):
+    """
+    Marks the trial as finished in its manifest, fills in the summary and removes the scratch directory.
+
+    Parameters:
+        trial_data (dict): One entry of DATA_PATHS.
+        summary (dict): Summary of the trial.
+        manifest (dict): The trial's manifest.
+        segment_rows (list): Segment information rows produced for the trial.
+        scratch_dir (str): Scratch directory of the trial.
 
-        LOG_FILE_CONTENT = ""
+    Returns:
+        dict: The summary.
+    """
+    trial_number = trial_data['trial_number']
+    complete_trial(manifest, segment_rows)
+    if manifest['failed_outputs']:
+        summary['status'] = f"{len(manifest['failed_outputs'])} failed encodes"
+    summary['rows'] = segment_rows
+
+    if os.path.exists(scratch_dir):
+        try:
+            shutil.rmtree(scratch_dir)
+            logging.info(f"Deleted rosbag folder after trial {trial_number}: {scratch_dir}")
+        except Exception as e:
+            logging.error(f"Failed to delete rosbag folder {scratch_dir}: {str(e)}")
+    return summary
+
+
+def process_trial(trial_data, scratch_dir):
+    """
+    Runs the whole pipeline for one trial: rosbag parsing, segment detection and video cutting.
+
+    Parameters:
+        trial_data (dict): One entry of DATA_PATHS.
+        scratch_dir (str): Directory for the trial's intermediate rosbag exports, deleted afterwards.
+
+    Returns:
+        dict: Summary of the trial with its 'status' and report 'rows'; the rows of a trial that is
+            up to date are taken from its manifest.
+    """
+    summary = {
+        'trial_number': trial_data['trial_number'],
+        'trial_type': trial_data['trial_type'],
+        'status': 'done',
+        'rows': []
+    }
+    trial = prepare_trial(trial_data, summary)
+    if trial is None:
+        return summary
 
-        if LOG_FILES:
-            for log_file_name in LOG_FILES:
-                log_file_path = os.path.join(LOG_FILE_DIR, log_file_name)
-                with open(log_file_path, 'r') as file:
-                    LOG_FILE_CONTENT += file.read() + "\n"
-        else:
-            LOG_FILE_CONTENT = None
+    segments_to_cut, segments_of_missing_phantom_transform = detect_trial_segments(trial_data, scratch_dir)
+
+    segment_rows = []
+    if segments_to_cut:
+        proxy_paths = None
+        if USE_PROXY_VIDEOS:
+            proxy_paths = generate_proxies(trial_data['VIDEO_DIR'], trial['video_files'])
+        segment_rows = cut_video_segments(
+            segments_to_cut,
+            segments_of_missing_phantom_transform,
+            trial_data['VIDEO_DIR'],
+            RESULTS_DIR_VID,
+            trial_data['trial_number'],
+            trial['log_file_paths'],
+            trial['video_files'],
+            trial_data['pretrial'],
+            trial_data['trial_type'],
+            manifest=trial['manifest'],
+            proxy_paths=proxy_paths
+        )
     else:
-        LOG_FILE_CONTENT = None
-        logging.info(f"No annotations available for trial {trial_number}.")
+        logging.info(f"No segments found for trial {trial_data['trial_number']}")
+        summary['status'] = 'no segments'
+    return finish_trial(trial_data, summary, trial['manifest'], segment_rows, scratch_dir)
 
-    segments_to_cut = process_telescope_transforms(ROSBAG_DATA_PATH)
-    segments_of_missing_phantom_transform = process_phantom_transforms(ROSBAG_DATA_PATH)
 
+async def process_trial_async(trial_data, scratch_dir, stages):
+    """
+    Asynchronous version of process_trial. Segment detection and planning run in worker threads and the
+    ffprobe/ffmpeg calls run as asyncio subprocesses, each stage bounded by its semaphore, so the stages
+    of different trials overlap.
+
+    Parameters:
+        trial_data (dict): One entry of DATA_PATHS.
+        scratch_dir (str): Directory for the trial's intermediate rosbag exports, deleted afterwards.
+        stages (dict): Stage semaphores from create_stage_semaphores.
+
+    Returns:
+        dict: Summary of the trial, see process_trial.
+    """
+    summary = {
+        'trial_number': trial_data['trial_number'],
+        'trial_type': trial_data['trial_type'],
+        'status': 'done',
+        'rows': []
+    }
+    trial = prepare_trial(trial_data, summary)
+    if trial is None:
+        return summary
+
+    async with stages['plan']:
+        segments_to_cut, segments_of_missing_phantom_transform = await asyncio.to_thread(
+            detect_trial_segments, trial_data, scratch_dir
+        )
+
+    segment_rows = []
     if segments_to_cut:
-        cut_video_segments(
+        proxy_paths = None
+        if USE_PROXY_VIDEOS:
+            proxy_paths = await generate_proxies_async(trial_data['VIDEO_DIR'], trial['video_files'], stages['encode'])
+        segment_rows = await cut_video_segments_async(
             segments_to_cut,
             segments_of_missing_phantom_transform,
-            VIDEO_DIR,
+            trial_data['VIDEO_DIR'],
             RESULTS_DIR_VID,
-            trial_number,
-            LOG_FILE_CONTENT,
-            VIDEO_FILES,
-            pretrial,
-            trial_type
+            trial_data['trial_number'],
+            trial['log_file_paths'],
+            trial['video_files'],
+            trial_data['pretrial'],
+            trial_data['trial_type'],
+            stages,
+            manifest=trial['manifest'],
+            proxy_paths=proxy_paths
         )
     else:
-        logging.info(f"No segments found for trial {trial_number}")
+        logging.info(f"No segments found for trial {trial_data['trial_number']}")
+        summary['status'] = 'no segments'
+    return finish_trial(trial_data, summary, trial['manifest'], segment_rows, scratch_dir)
+
+
+def run_trial_worker(trial_data, trial_log_path, scratch_dir):
+    """
+    Entry point of a worker process: processes one trial and logs to the trial's own log file.
+
+    Parameters:
+        trial_data (dict): One entry of DATA_PATHS.
+        trial_log_path (str): Path of the trial's log file.
+        scratch_dir (str): Scratch directory of the trial.
 
-    rosbag_folder = os.path.join(os.getcwd(), 'rosbag')
-    if os.path.exists(rosbag_folder):
+    Returns:
+        dict: Summary of the trial, see process_trial.
+    """
+    old_stdout = sys.stdout
+    old_stderr = sys.stderr
+    with open(trial_log_path, 'a') as trial_log:
+        sys.stdout = trial_log
+        sys.stderr = trial_log
+        logging.basicConfig(level=logging.INFO, stream=trial_log, format=LOG_FORMAT, force=True)
         try:
-            shutil.rmtree(rosbag_folder)
-            logging.info(f"Deleted rosbag folder after trial {trial_number}: {rosbag_folder}")
+            summary = process_trial(trial_data, scratch_dir)
         except Exception as e:
-            logging.error(f"Failed to delete rosbag folder {rosbag_folder}: {str(e)}")
+            logging.exception(f"Trial {trial_data['trial_number']} failed")
+            summary = {
+                'trial_number': trial_data['trial_number'],
+                'trial_type': trial_data['trial_type'],
+                'status': f"failed: {e}",
+                'rows': []
+            }
+        finally:
+            logging.shutdown()
+            sys.stdout = old_stdout
+            sys.stderr = old_stderr
+    summary['log_file'] = trial_log_path
+    return summary
+
+
+def run_trials_in_parallel(jobs, run_log_dir, report):
+    """
+    Processes the trials in separate worker processes, each with its own scratch directory and log
+    file, and adds their segment information to the report in trial order.
+
+    Parameters:
+        jobs (int): Number of worker processes.
+        run_log_dir (str): Directory for the per-trial log files.
+        report (dict): Report sink collecting the segment information of the run.
+    """
+    os.makedirs(run_log_dir, exist_ok=True)
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {}
+        for index, trial_data in enumerate(DATA_PATHS):
+            trial_key = f"{trial_data['trial_type']}_{trial_data['trial_number']}"
+            futures[pool.submit(
+                run_trial_worker,
+                trial_data,
+                os.path.join(run_log_dir, f"{trial_key}.txt"),
+                os.path.join(os.getcwd(), 'rosbag', trial_key)
+            )] = index
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                summaries[index] = future.result()
+            except Exception as e:
+                trial_data = DATA_PATHS[index]
+                summaries[index] = {
+                    'trial_number': trial_data['trial_number'],
+                    'trial_type': trial_data['trial_type'],
+                    'status': f"worker crashed: {e}",
+                    'rows': []
+                }
+            logging.info(f"Finished trial {summaries[index]['trial_number']}: {summaries[index]['status']}")
+
+    logging.info("Summary:")
+    for index in sorted(summaries):
+        summary = summaries[index]
+        add_report_rows(report, summary['rows'])
+        logging.info(
+            f"Trial {summary['trial_number']}: {summary['status']}, {len(summary['rows'])} segments"
+            f" (log: {summary.get('log_file', '-')})"
+        )
+
+
+async def run_trials_async(report):
+    """
+    Processes all trials concurrently in one event loop with bounded probe, plan and encode stages, so
+    probing and planning the next trials overlaps with encoding the current ones.
+
+    Parameters:
+        report (dict): Report sink collecting the segment information of the run.
+    """
+    stages = create_stage_semaphores()
+    trial_tasks = []
+    for trial_data in DATA_PATHS:
+        trial_key = f"{trial_data['trial_type']}_{trial_data['trial_number']}"
+        trial_tasks.append(process_trial_async(trial_data, os.path.join(os.getcwd(), 'rosbag', trial_key), stages))
+    summaries = await asyncio.gather(*trial_tasks, return_exceptions=True)
+
+    logging.info("Summary:")
+    for trial_data, summary in zip(DATA_PATHS, summaries):
+        if isinstance(summary, BaseException):
+            logging.error(f"Trial {trial_data['trial_number']} failed", exc_info=summary)
+            summary = {
+                'trial_number': trial_data['trial_number'],
+                'trial_type': trial_data['trial_type'],
+                'status': f"failed: {summary}",
+                'rows': []
+            }
+        add_report_rows(report, summary['rows'])
+        logging.info(f"Trial {summary['trial_number']}: {summary['status']}, {len(summary['rows'])} segments")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Cut the parts of the trial videos with line of sight issues.")
+    arg_parser.add_argument(
+        '--jobs', type=int, default=1,
+        help="number of trials processed in parallel worker processes (default: 1)"
+    )
+    arg_parser.add_argument(
+        '--pipeline', action='store_true',
+        help="process all trials in one asyncio event loop, overlapping probing, planning and encoding"
+    )
+    args = arg_parser.parse_args()
+    if args.pipeline and args.jobs > 1:
+        arg_parser.error("--pipeline and --jobs cannot be combined")
+
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    print(f"Script started at {current_time}")
+    log_filename = f"log_{current_time}.txt"
+    log_file_path = os.path.join(LOGS_DIR, log_filename)
+    old_stdout = sys.stdout
+    old_stderr = sys.stderr
+
+    log_file = open(log_file_path, 'a')
+
+    sys.stdout = log_file
+    sys.stderr = log_file
+
+    logging.basicConfig(
+        level=logging.INFO,
+        stream=log_file,
+        format=LOG_FORMAT
+    )
+
+    logging.info("Starting the script")
+
+    os.makedirs(RESULTS_DIR_VID, exist_ok=True)
+
+    report = create_segment_report(os.path.join(RESULTS_DIR_VID, 'segment_info.xlsx'))
+    if args.pipeline:
+        asyncio.run(run_trials_async(report))
+    elif args.jobs > 1:
+        run_trials_in_parallel(args.jobs, os.path.join(LOGS_DIR, f"log_{current_time}"), report)
+    else:
+        for trial_data in DATA_PATHS:
+            summary = process_trial(trial_data, os.path.join(os.getcwd(), 'rosbag'))
+            add_report_rows(report, summary['rows'])
+
+    if write_segment_report(report):
+        logging.info(f"Segment information written to Excel file: {report['path']}")
+    else:
+        logging.info("No segment information to write to Excel.")
+
+    logging.info("Script ended")
+    logging.shutdown()
+    sys.stdout = old_stdout
+    sys.stderr = old_stderr
+    log_file.close()
+    print(f"Script ended at {datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
 
 
-logging.info("Script ended")
-logging.shutdown()
-sys.stdout = old_stdout
-sys.stderr = old_stderr
-log_file.close()
-print(f"Script ended at {datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from ..shared.config import CUT_MODE, ENCODE_WORKERS, ENCODE_TIMEOUT, PROBE_WORKERS, PLAN_WORKERS, PROXY_TIMEOUT
+from ..shared.metadata_cache import get_cached_metadata, store_metadata, save_metadata_cache
+from .video_processing import parse_probe_metadata, plan_cut, record_encoded_unit, finish_cut
+from .proxies import plan_proxies, finish_proxy
+
+def create_stage_semaphores(probe_workers=PROBE_WORKERS, plan_workers=PLAN_WORKERS, encode_workers=ENCODE_WORKERS):
+    """
+    Creates the semaphores bounding each stage of the asynchronous pipeline. They are shared by all
+    trials of a run, so the limits hold across trials. Must be called inside the running event loop.
+
+    Parameters:
+        probe_workers (int): Maximum number of ffprobe processes at the same time.
+        plan_workers (int): Maximum number of trials detecting and planning segments at the same time.
+        encode_workers (int): Maximum number of encode jobs at the same time.
+
+    Returns:
+        dict: {'probe', 'plan', 'encode'} semaphores.
+    """
+    return {
+        'probe': asyncio.BoundedSemaphore(max(1, probe_workers)),
+        'plan': asyncio.BoundedSemaphore(max(1, plan_workers)),
+        'encode': asyncio.BoundedSemaphore(max(1, encode_workers))
+    }
+
+async def run_command_async(cmd, timeout=None):
+    """
+    Runs a command as an asyncio subprocess and captures its output.
+
+    Parameters:
+        cmd (list): Command line.
+        timeout (float): Seconds after which the process is killed, or None for no limit.
+
+    Returns:
+        tuple: (returncode, stdout, stderr) with the output as bytes.
+
+    Raises:
+        asyncio.TimeoutError: If the process did not finish in time.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    return process.returncode, stdout, stderr
+
+async def run_ffmpeg_commands_async(commands, timeout=ENCODE_TIMEOUT):
+    """
+    Asynchronous version of run_ffmpeg_commands: runs the commands of one job one after another,
+    stopping at the first failure.
+
+    Parameters:
+        commands (list): ffmpeg command lines, e.g. from ffmpeg-python's compile().
+        timeout (float): Seconds the whole job may take before its running process is killed, or None for no limit.
+
+    Returns:
+        tuple: (success, error_message) where error_message holds the captured stderr on failure.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for cmd in commands:
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            returncode, _, stderr = await run_command_async(cmd, remaining)
+        except asyncio.TimeoutError:
+            return False, f"Timed out after {timeout} seconds"
+        except OSError as e:
+            return False, str(e)
+        if returncode != 0:
+            return False, stderr.decode(errors='replace')
+    return True, ''
+
+async def probe_video_async(video_path, semaphore):
+    """
+    Probes a video with ffprobe and stores its metadata in the metadata cache, so that planning
+    finds it there instead of blocking on ffprobe. Videos already in the cache are not probed again.
+
+    Parameters:
+        video_path (str): Path to the video file.
+        semaphore: Semaphore bounding the concurrent ffprobe processes.
+
+    Returns:
+        bool: True if the metadata is in the cache afterwards.
+    """
+    if get_cached_metadata(video_path) is not None:
+        return True
+    async with semaphore:
+        try:
+            returncode, stdout, stderr = await run_command_async(
+                ['ffprobe', '-show_format', '-show_streams', '-of', 'json', video_path]
+            )
+        except OSError as e:
+            logging.error(f"Could not run ffprobe for {video_path}: {e}")
+            return False
+    if returncode != 0:
+        logging.error(f"ffprobe failed for {video_path}: {stderr.decode(errors='replace')}")
+        return False
+    try:
+        metadata = parse_probe_metadata(video_path, json.loads(stdout))
+    except (ValueError, KeyError) as e:
+        logging.error(e)
+        return False
+    store_metadata(video_path, metadata)
+    return True
+
+async def probe_videos_async(video_paths, semaphore):
+    """
+    Probes several videos concurrently, see probe_video_async.
+
+    Parameters:
+        video_paths (list): Paths to the video files.
+        semaphore: Semaphore bounding the concurrent ffprobe processes.
+
+    Returns:
+        list: One bool per video, True if its metadata is in the cache.
+    """
+    return await asyncio.gather(*(probe_video_async(video_path, semaphore) for video_path in video_paths))
+
+async def run_encode_jobs_async(jobs, semaphore, timeout=ENCODE_TIMEOUT, on_complete=None, timeouts=None):
+    """
+    Asynchronous version of run_encode_jobs.
+
+    Parameters:
+        jobs (list): One list of compiled ffmpeg command lines per job.
+        semaphore: Semaphore bounding the concurrent encode jobs.
+        timeout (float): Per-job timeout in seconds, or None for no limit.
+        on_complete (callable): Optional callback(index, result) invoked in the event loop as each job finishes.
+        timeouts (list): Optional timeout of every job, overriding timeout.
+
+    Returns:
+        list: (success, error_message) tuples in the same order as jobs.
+    """
+    results = [None] * len(jobs)
+    timeouts = timeouts or [timeout] * len(jobs)
+
+    async def run_job(index, commands):
+        async with semaphore:
+            try:
+                results[index] = await run_ffmpeg_commands_async(commands, timeouts[index])
+            except Exception as e:
+                results[index] = (False, str(e))
+        if on_complete is not None:
+            on_complete(index, results[index])
+        logging.info(f"Finished encode {sum(result is not None for result in results)}/{len(jobs)}")
+
+    await asyncio.gather(*(run_job(index, commands) for index, commands in enumerate(jobs)))
+    return results
+
+async def generate_proxies_async(video_dir, video_files, semaphore):
+    """
+    Asynchronous version of generate_proxies.
+
+    Parameters:
+        video_dir (str): Directory containing the video files.
+        video_files (list): List of video files for the trial.
+        semaphore: Semaphore bounding the concurrent encode jobs.
+
+    Returns:
+        dict: {video_file: proxy_path} of every video that has a proxy to cut from.
+    """
+    proxy_paths, pending = plan_proxies(video_dir, video_files)
+    if not pending:
+        return proxy_paths
+
+    def record_finished_proxy(index, result):
+        finish_proxy(proxy_paths, pending[index], result)
+
+    encoding_started = time.perf_counter()
+    await run_encode_jobs_async(
+        [proxy_job['commands'] for proxy_job in pending], semaphore, timeout=PROXY_TIMEOUT,
+        on_complete=record_finished_proxy
+    )
+    logging.info(f"Encoded {len(pending)} proxy videos in {time.perf_counter() - encoding_started:.2f} s")
+    return proxy_paths
+
+async def cut_video_segments_async(
+    segments,
+    phantom_missing,
+    video_dir,
+    results_dir,
+    trial_number,
+    LOG_FILES,
+    VIDEO_FILES,
+    pretrial,
+    trial_type,
+    stages,
+    cut_mode=CUT_MODE,
+    manifest=None,
+    proxy_paths=None
+):
+    """
+    Asynchronous version of cut_video_segments that runs the trial through the probe, plan and
+    encode stages, each bounded by its semaphore.
+
+    Parameters:
+        stages (dict): Stage semaphores from create_stage_semaphores.
+        See cut_video_segments for the other parameters.
+
+    Returns:
+        list: The segment information rows of the trial.
+    """
+    await probe_videos_async([os.path.join(video_dir, video_file) for video_file in VIDEO_FILES], stages['probe'])
+    await asyncio.to_thread(save_metadata_cache)
+
+    async with stages['plan']:
+        cut_plan = await asyncio.to_thread(
+            plan_cut,
+            segments, phantom_missing, video_dir, results_dir, trial_number, LOG_FILES, VIDEO_FILES, pretrial,
+            cut_mode, manifest, proxy_paths
+        )
+
+    def record_finished_unit(index, result):
+        record_encoded_unit(cut_plan, index, result, manifest)
+
+    encoding_started = time.perf_counter()
+    await run_encode_jobs_async(
+        [commands for commands, _ in cut_plan['encode_units']], stages['encode'], on_complete=record_finished_unit,
+        timeouts=cut_plan['encode_timeouts']
+    )
+    logging.info(f"Encoded {len(cut_plan['pending_jobs'])} video segments in {time.perf_counter() - encoding_started:.2f} s")
+    return finish_cut(cut_plan, trial_number, pretrial, trial_type)
@@ -0,0 +1,415 @@
+import os
+import math
+import ffmpeg
+from ..shared.config import (
+    COMPOSITE_VIDEO_TYPES,
+    COMPOSITE_TILE_WIDTH,
+    COMPOSITE_TILE_HEIGHT,
+    ENCODING_PROFILES,
+    ENCODING_PROFILE,
+    VIDEO_TYPE_ENCODING_PROFILES
+)
+from ..shared.metadata_cache import get_cached_keyframes, store_keyframes
+from .overlays import apply_overlays, format_srt_file
+
+def get_encoding_profile(video_type=None):
+    """
+    Looks up the encoding profile used for a video type.
+
+    Parameters:
+        video_type (str): Video type, e.g. 'Room' or 'Composite'; None for the default profile.
+
+    Returns:
+        tuple: (profile_name, profile) with the settings from ENCODING_PROFILES.
+    """
+    profile_name = VIDEO_TYPE_ENCODING_PROFILES.get(video_type, ENCODING_PROFILE)
+    return profile_name, ENCODING_PROFILES[profile_name]
+
+def get_encoder_args(profile):
+    return {key: value for key, value in profile.items() if key != 'max_height'}
+
+def apply_profile_scaling(video_stream, profile):
+    """
+    Downscales a video stream to the profile's max_height, keeping the aspect ratio and never upscaling.
+
+    Parameters:
+        video_stream: ffmpeg-python video stream.
+        profile (dict): Encoding profile from ENCODING_PROFILES.
+
+    Returns:
+        The filtered ffmpeg-python video stream.
+    """
+    if not profile.get('max_height'):
+        return video_stream
+    return video_stream.filter('scale', -2, f"min(ih,{profile['max_height']})")
+
+def build_proxy_command(video_path, proxy_path, profile):
+    """
+    Builds the ffmpeg command that encodes a downscaled proxy of a whole source video.
+
+    Parameters:
+        video_path (str): Path of the source video.
+        proxy_path (str): Path of the proxy video.
+        profile (dict): Encoding profile from ENCODING_PROFILES.
+
+    Returns:
+        list: The compiled ffmpeg command line. The source metadata, including its creation_time,
+        is copied to the proxy.
+    """
+    stream = ffmpeg.input(video_path)
+    video_stream = apply_profile_scaling(stream.video.filter('fps', fps=30), profile)
+    return (
+        ffmpeg
+        .output(video_stream, stream.audio, proxy_path, map_metadata=0, **get_encoder_args(profile))
+        .compile(overwrite_output=True)
+    )
+
+def build_burn_in_command(input_parts, overlays, output_filename, profile=None):
+    """
+    Builds the ffmpeg command that re-encodes a segment with the overlays burned in.
+
+    Parameters:
+        input_parts (list): (video_path, ss, duration) tuples in playback order.
+        overlays (list): Overlays from build_overlay_timeline.
+        output_filename (str): Path of the output video.
+        profile (dict): Encoding profile from ENCODING_PROFILES, None for the default profile.
+
+    Returns:
+        tuple: (commands, temporary_paths, job_files) with the compiled ffmpeg command lines, the
+        intermediate files to remove once they have run and the {path: content} files to write before.
+    """
+    profile = profile or get_encoding_profile()[1]
+    streams = [ffmpeg.input(vid_path, ss=ss, t=duration) for vid_path, ss, duration in input_parts]
+
+    if len(streams) > 1:
+        video_concat = ffmpeg.concat(*streams, v=1, a=1).node
+        video_stream = video_concat[0]
+        audio_stream = video_concat[1]
+    else:
+        video_stream = streams[0]
+        audio_stream = streams[0].audio
+
+    video_stream = video_stream.filter('fps', fps=30)
+    video_stream = apply_overlays(video_stream, overlays)
+    video_stream = apply_profile_scaling(video_stream, profile)
+
+    cmd = (
+        ffmpeg
+        .output(video_stream, audio_stream, output_filename, **get_encoder_args(profile))
+        .compile(overwrite_output=True)
+    )
+    return [cmd], [], {}
+
+def build_composite_command(type_parts, overlays, output_filename, profile=None):
+    """
+    Builds the ffmpeg command that tiles the videos of all video types for the same segment into one
+    downscaled clip and burns the overlays in once on top of the tiles.
+
+    Parameters:
+        type_parts (list): (video_type, input_parts) tuples, one per video type, where input_parts are
+        (video_path, ss, duration) tuples in playback order.
+        overlays (list): Overlays from build_overlay_timeline.
+        output_filename (str): Path of the output video.
+        profile (dict): Encoding profile from ENCODING_PROFILES, None for the default profile.
+
+    Returns:
+        tuple: (commands, temporary_paths, job_files) with the compiled ffmpeg command lines, the
+        intermediate files to remove once they have run and the {path: content} files to write before.
+    """
+    profile = profile or get_encoding_profile()[1]
+
+    def tile_order(type_part):
+        video_type = type_part[0]
+        if video_type in COMPOSITE_VIDEO_TYPES:
+            return COMPOSITE_VIDEO_TYPES.index(video_type), video_type
+        return len(COMPOSITE_VIDEO_TYPES), video_type
+
+    tiles = []
+    audio_stream = None
+    for _, input_parts in sorted(type_parts, key=tile_order):
+        streams = [ffmpeg.input(vid_path, ss=ss, t=duration) for vid_path, ss, duration in input_parts]
+        if len(streams) > 1:
+            video_concat = ffmpeg.concat(*streams, v=1, a=1).node
+            video_stream = video_concat[0]
+            tile_audio = video_concat[1]
+        else:
+            video_stream = streams[0].video
+            tile_audio = streams[0].audio
+        if audio_stream is None:
+            audio_stream = tile_audio
+        tiles.append(
+            video_stream
+            .filter('fps', fps=30)
+            .filter('scale', COMPOSITE_TILE_WIDTH, COMPOSITE_TILE_HEIGHT, force_original_aspect_ratio='decrease')
+            .filter('pad', COMPOSITE_TILE_WIDTH, COMPOSITE_TILE_HEIGHT, '(ow-iw)/2', '(oh-ih)/2')
+            .filter('setsar', 1)
+        )
+
+    if len(tiles) == 1:
+        video_stream = tiles[0]
+    elif len(tiles) <= 3:
+        video_stream = ffmpeg.filter(tiles, 'hstack', inputs=len(tiles))
+    else:
+        columns = math.ceil(math.sqrt(len(tiles)))
+        layout = '|'.join(
+            f"{(index % columns) * COMPOSITE_TILE_WIDTH}_{(index // columns) * COMPOSITE_TILE_HEIGHT}"
+            for index in range(len(tiles))
+        )
+        video_stream = ffmpeg.filter(tiles, 'xstack', inputs=len(tiles), layout=layout, fill='black')
+
+    video_stream = apply_overlays(video_stream, overlays)
+    video_stream = apply_profile_scaling(video_stream, profile)
+
+    cmd = (
+        ffmpeg
+        .output(video_stream, audio_stream, output_filename, **get_encoder_args(profile))
+        .compile(overwrite_output=True)
+    )
+    return [cmd], [], {}
+
+def build_batch_command(video_path, batch_parts, profile=None):
+    """
+    Builds one ffmpeg command that decodes a source video once and writes several segments of it,
+    each with its own overlays, by splitting the decoded streams and trimming every branch.
+
+    Parameters:
+        video_path (str): Path of the source video.
+        batch_parts (list): (ss, duration, overlays, output_filename) tuples, one per segment.
+        profile (dict): Encoding profile from ENCODING_PROFILES, None for the default profile.
+
+    Returns:
+        tuple: (commands, temporary_paths, job_files) with the compiled ffmpeg command lines, the
+        intermediate files to remove once they have run and the {path: content} files to write before.
+    """
+    profile = profile or get_encoding_profile()[1]
+    first_ss = min(ss for ss, _, _, _ in batch_parts)
+    source = ffmpeg.input(video_path, ss=first_ss)
+    video_branches = source.video.filter_multi_output('split', len(batch_parts))
+    audio_branches = source.audio.filter_multi_output('asplit', len(batch_parts))
+
+    outputs = []
+    for index, (ss, duration, overlays, output_filename) in enumerate(batch_parts):
+        start = ss - first_ss
+        video_stream = (
+            video_branches[index]
+            .trim(start=start, end=start + duration)
+            .setpts('PTS-STARTPTS')
+            .filter('fps', fps=30)
+        )
+        video_stream = apply_overlays(video_stream, overlays)
+        video_stream = apply_profile_scaling(video_stream, profile)
+        audio_stream = (
+            audio_branches[index]
+            .filter('atrim', start=start, end=start + duration)
+            .filter('asetpts', 'PTS-STARTPTS')
+        )
+        outputs.append(ffmpeg.output(video_stream, audio_stream, output_filename, **get_encoder_args(profile)))
+
+    cmd = ffmpeg.merge_outputs(*outputs).compile(overwrite_output=True)
+    return [cmd], [], {}
+
+def format_concat_list(input_parts):
+    """
+    Formats an ffconcat list that joins the given parts of several videos with the concat demuxer.
+
+    Parameters:
+        input_parts (list): (video_path, ss, duration) tuples in playback order; ss and duration may
+        be None to take the whole file.
+
+    Returns:
+        str: Content of the list file.
+    """
+    lines = ["ffconcat version 1.0\n"]
+    for vid_path, ss, duration in input_parts:
+        escaped_path = os.path.abspath(vid_path).replace("'", "'\\''")
+        lines.append(f"file '{escaped_path}'\n")
+        if ss is not None:
+            lines.append(f"inpoint {ss}\n")
+            lines.append(f"outpoint {ss + duration}\n")
+    return ''.join(lines)
+
+def build_subtitled_copy_command(source, srt_path, output_filename):
+    return (
+        ffmpeg
+        .output(
+            source.video, source.audio, ffmpeg.input(srt_path), output_filename,
+            c='copy', **{'c:s': 'mov_text', 'avoid_negative_ts': 'make_zero'}
+        )
+        .compile(overwrite_output=True)
+    )
+
+def build_stream_copy_command(input_parts, overlays, segment_duration, output_filename):
+    """
+    Builds the ffmpeg command for the fast cut mode: the segment is stream-copied from the nearest
+    keyframe and the overlays are written to a sidecar SRT file that is also muxed in as a subtitle track.
+
+    Parameters:
+        input_parts (list): (video_path, ss, duration) tuples in playback order.
+        overlays (list): Overlays from build_overlay_timeline.
+        segment_duration (float): Duration of the cut segment.
+        output_filename (str): Path of the output video.
+
+    Returns:
+        tuple: (commands, temporary_paths, job_files) with the compiled ffmpeg command lines, the
+        intermediate files to remove once they have run and the {path: content} files to write before.
+    """
+    output_base = os.path.splitext(output_filename)[0]
+    srt_path = f"{output_base}.srt"
+    job_files = {srt_path: format_srt_file(overlays, segment_duration)}
+
+    temporary_paths = []
+    if len(input_parts) > 1:
+        list_path = f"{output_base}.ffconcat"
+        job_files[list_path] = format_concat_list(input_parts)
+        temporary_paths.append(list_path)
+        source = ffmpeg.input(list_path, f='concat', safe=0)
+    else:
+        vid_path, ss, duration = input_parts[0]
+        source = ffmpeg.input(vid_path, ss=ss, t=duration)
+
+    return [build_subtitled_copy_command(source, srt_path, output_filename)], temporary_paths, job_files
+
+def get_keyframe_times(video_path, start, end):
+    """
+    Lists the keyframe timestamps of the first video stream within a time range. Results are served
+    from the metadata cache while the file is unchanged, so each range is only scanned once.
+
+    Parameters:
+        video_path (str): Path to the video file.
+        start (float): Start of the range in seconds of the video.
+        end (float): End of the range in seconds of the video.
+
+    Returns:
+        list: Sorted keyframe timestamps in seconds of the video.
+    """
+    keyframes = get_cached_keyframes(video_path, start, end)
+    if keyframes is not None:
+        return keyframes
+    probe = ffmpeg.probe(
+        video_path,
+        select_streams='v:0',
+        show_entries='packet=pts_time,flags',
+        read_intervals=f'{max(start, 0)}%{end}'
+    )
+    keyframes = sorted(
+        float(packet['pts_time'])
+        for packet in probe.get('packets', [])
+        if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A')
+    )
+    store_keyframes(video_path, start, end, keyframes)
+    return keyframes
+
+KEYFRAME_TOLERANCE = 0.001 # seconds within which a keyframe counts as being at the segment start
+
+def plan_hybrid_parts(keyframes, overlays, segment_duration):
+    """
+    Splits a segment into parts that must be re-encoded and parts that can be stream-copied.
+
+    Every timed overlay window is widened to the GOPs it touches, so copied parts always start
+    on a keyframe. Everything before the first keyframe inside the segment is re-encoded as well,
+    unless a keyframe lies right at the segment start; the probed keyframes usually start with the
+    one before it.
+
+    Parameters:
+        keyframes (list): Keyframe timestamps relative to the segment start.
+        overlays (list): Overlays from build_overlay_timeline.
+        segment_duration (float): Duration of the cut segment.
+
+    Returns:
+        list: (start, end, reencode) tuples covering the whole segment in order.
+    """
+    boundaries = [keyframe for keyframe in keyframes if KEYFRAME_TOLERANCE < keyframe < segment_duration]
+    windows = []
+    if not any(abs(keyframe) <= KEYFRAME_TOLERANCE for keyframe in keyframes):
+        windows.append((0, boundaries[0] if boundaries else segment_duration))
+    for overlay in overlays:
+        if overlay['start'] is None or overlay['end'] <= 0 or overlay['start'] >= segment_duration:
+            continue
+        window_start = max((keyframe for keyframe in boundaries if keyframe <= overlay['start']), default=0)
+        window_end = min((keyframe for keyframe in boundaries if keyframe >= overlay['end']), default=segment_duration)
+        windows.append((window_start, window_end))
+    windows.sort()
+
+    merged_windows = []
+    for window_start, window_end in windows:
+        if merged_windows and window_start <= merged_windows[-1][1]:
+            merged_windows[-1] = (merged_windows[-1][0], max(merged_windows[-1][1], window_end))
+        else:
+            merged_windows.append((window_start, window_end))
+
+    parts = []
+    position = 0
+    for window_start, window_end in merged_windows:
+        if window_start > position:
+            parts.append((position, window_start, False))
+        parts.append((window_start, window_end, True))
+        position = window_end
+    if position < segment_duration:
+        parts.append((position, segment_duration, False))
+    return parts
+
+def shift_overlays(overlays, part_start, part_end):
+    shifted = []
+    for overlay in overlays:
+        if overlay['start'] is None:
+            shifted.append(overlay)
+        elif overlay['end'] > part_start and overlay['start'] < part_end:
+            shifted.append(dict(
+                overlay,
+                start=max(overlay['start'], part_start) - part_start,
+                end=min(overlay['end'], part_end) - part_start
+            ))
+    return shifted
+
+def build_hybrid_commands(input_part, overlays, segment_duration, output_filename, profile=None):
+    """
+    Builds the ffmpeg commands for the hybrid cut mode: only the GOPs overlapping a timed overlay
+    are re-encoded with the overlays burned in, everything else is stream-copied, and the parts are
+    joined with the concat demuxer. The overlays are also written to a sidecar SRT subtitle track,
+    since the static length label is only burned into the re-encoded parts. The re-encoded parts use
+    the profile's encoder settings except for its max_height and g: they keep the source resolution,
+    so they can be joined with the copied parts, and use x264's default keyframe interval.
+
+    Parameters:
+        input_part (tuple): (video_path, ss, duration) of the single source video.
+        overlays (list): Overlays from build_overlay_timeline.
+        segment_duration (float): Duration of the cut segment.
+        output_filename (str): Path of the output video.
+        profile (dict): Encoding profile from ENCODING_PROFILES, None for the default profile.
+
+    Returns:
+        tuple: (commands, temporary_paths, job_files) with the compiled ffmpeg command lines, the
+        intermediate files to remove once they have run and the {path: content} files to write before.
+        Nothing is written here, so planning a segment that turns out to be up to date stays cheap.
+    """
+    profile = profile or get_encoding_profile()[1]
+    part_encoder_args = {key: value for key, value in get_encoder_args(profile).items() if key != 'g'}
+    vid_path, ss, duration = input_part
+    keyframes = [keyframe - ss for keyframe in get_keyframe_times(vid_path, ss, ss + duration)]
+    parts = plan_hybrid_parts(keyframes, overlays, segment_duration)
+
+    output_base = os.path.splitext(output_filename)[0]
+    parts_dir = f"{output_base}_parts"
+    srt_path = f"{output_base}.srt"
+
+    commands = []
+    part_files = []
+    for index, (part_start, part_end, reencode) in enumerate(parts):
+        part_file = os.path.join(parts_dir, f'part_{index:03d}.mp4')
+        part_files.append((part_file, None, None))
+        part_input = ffmpeg.input(vid_path, ss=ss + part_start, t=part_end - part_start)
+        if reencode:
+            video_stream = apply_overlays(part_input.video, shift_overlays(overlays, part_start, part_end))
+            part_output = ffmpeg.output(video_stream, part_input.audio, part_file, **part_encoder_args)
+        else:
+            part_output = ffmpeg.output(part_input.video, part_input.audio, part_file, c='copy', avoid_negative_ts='make_zero')
+        commands.append(part_output.compile(overwrite_output=True))
+
+    list_path = os.path.join(parts_dir, 'parts.ffconcat')
+    job_files = {
+        srt_path: format_srt_file(overlays, segment_duration),
+        list_path: format_concat_list(part_files)
+    }
+    source = ffmpeg.input(list_path, f='concat', safe=0)
+    commands.append(build_subtitled_copy_command(source, srt_path, output_filename))
+    return commands, [parts_dir], job_files
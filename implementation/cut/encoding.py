@@ -0,0 +1,115 @@
+import os
+import time
+import shutil
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from ..shared.config import ENCODE_EXECUTOR, ENCODE_WORKERS, ENCODE_TIMEOUT
+
+def run_ffmpeg_commands(commands, timeout=ENCODE_TIMEOUT):
+    """
+    Runs the compiled ffmpeg commands of one job one after another, stopping at the first failure.
+
+    Parameters:
+        commands (list): ffmpeg command lines, e.g. from ffmpeg-python's compile().
+        timeout (float): Seconds the whole job may take before its running process is killed, or None for no limit.
+
+    Returns:
+        tuple: (success, error_message) where error_message holds the captured stderr on failure.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for cmd in commands:
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=remaining)
+        except subprocess.TimeoutExpired:
+            return False, f"Timed out after {timeout} seconds"
+        except OSError as e:
+            return False, str(e)
+        if result.returncode != 0:
+            return False, result.stderr.decode(errors='replace')
+    return True, ''
+
+def run_encode_jobs(
+    jobs,
+    max_workers=ENCODE_WORKERS,
+    timeout=ENCODE_TIMEOUT,
+    executor=ENCODE_EXECUTOR,
+    on_complete=None,
+    timeouts=None
+):
+    """
+    Runs ffmpeg jobs concurrently on a bounded thread or process pool.
+
+    Parameters:
+        jobs (list): One list of compiled ffmpeg command lines per job.
+        max_workers (int): Maximum number of jobs running at the same time.
+        timeout (float): Per-job timeout in seconds, or None for no limit.
+        executor (str): 'thread' or 'process'.
+        on_complete (callable): Optional callback(index, result) invoked in the calling thread as each job finishes.
+        timeouts (list): Optional timeout of every job, overriding timeout.
+
+    Returns:
+        list: (success, error_message) tuples in the same order as jobs.
+    """
+    if not jobs:
+        return []
+    timeouts = timeouts or [timeout] * len(jobs)
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    results = [None] * len(jobs)
+    with pool_class(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+        futures = {
+            pool.submit(run_ffmpeg_commands, commands, timeouts[index]): index
+            for index, commands in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = (False, str(e))
+            if on_complete is not None:
+                on_complete(index, results[index])
+            logging.info(f"Finished encode {sum(result is not None for result in results)}/{len(jobs)}")
+    return results
+
+def write_job_files(job_files):
+    """
+    Writes the files a job's ffmpeg commands read, such as subtitle and concat lists.
+
+    Parameters:
+        job_files (dict): {path: content} of the files to write.
+    """
+    for path, content in job_files.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+
+def scale_timeout(timeout, job_count):
+    """
+    Scales the per-segment timeout to an encode unit that writes several segments, such as a batch.
+
+    Parameters:
+        timeout (float): Per-segment timeout in seconds, or None for no limit.
+        job_count (int): Number of segments the unit writes.
+
+    Returns:
+        float: The timeout of the unit, or None for no limit.
+    """
+    return None if timeout is None else timeout * max(job_count, 1)
+
+def remove_temporary_paths(paths):
+    """
+    Removes intermediate files and directories a job left behind.
+
+    Parameters:
+        paths (list): Paths of files or directories to remove.
+    """
+    for path in paths:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logging.warning(f"Could not remove temporary path {path}: {e}")
@@ -1,21 +1,28 @@
-from openpyxl import load_workbook
+import os
+from openpyxl.utils import get_column_letter
 from datetime import datetime
 import pandas as pd
-import os
 import pytz
 import re
 
+REPORT_COLUMN_WIDTHS = {
+    'Original Videos': 45,
+    'Performed Step': 45,
+    'Reason': 60
+}
+
 def collect_segment_info(
     segment_info_list,
     segment_info,
     los_issue_duration,
     segment_index,
     log_steps,
-    log_step_description,
+    log_step,
     los_issue_start_time,
     trial_number,
     pretrial,
-    trial_type
+    trial_type,
+    segment_keys=None
 ):
     """
     Collects information about a video segment and appends it to the segment_info_list if:
@@ -27,12 +34,14 @@ def collect_segment_info(
         segment_info (dict): Information about the current segment.
         los_issue_duration (float): Duration of the LOS issue.
         segment_index (int): Index of the segment.
-        log_steps (list): List of parsed log steps.
-        log_step_description (str): Description of the log step.
+        log_steps (LogStepIndex): Index of the parsed log steps, or None.
+        log_step (dict): The log step record the LOS issue falls into, or None.
         los_issue_start_time (float): Start time of the LOS issue.
         trial_number (str): The trial number extracted from the directory name.
         pretrial (bool): Indicates if it's a pretrial.
         trial_type (str): The trial type extracted from the directory name.
+        segment_keys (set): Keys of the rows already in segment_info_list, see get_segment_key. Kept up to
+            date by this function; built from segment_info_list when not given.
     """
     trial_number = str(int(trial_number)) if trial_number.isdigit() else trial_number
     origin_videos_info = []
@@ -60,24 +69,17 @@ def collect_segment_info(
 
     length_secs = los_issue_duration
 
-    if pretrial or log_steps is None or log_step_description is None:
+    if pretrial or log_steps is None or (log_steps.steps and log_step is None):
         performed_step = ''
         step_length_mmss = ''
+    elif log_step is None or not log_step['description']:
+        performed_step = 'NaN'
+        step_length_mmss = 'NaN'
     else:
-        performed_step = log_step_description if log_step_description else 'NaN'
-
-        if log_steps and log_step_description:
-            for step in log_steps:
-                if step['description'] == log_step_description:
-                    step_length_secs = step['end_time'] - step['start_time']
-                    minutes = int(step_length_secs // 60)
-                    seconds = int(step_length_secs % 60)
-                    step_length_mmss = f"{minutes}:{seconds:02d}"
-                    break
-            else:
-                step_length_mmss = 'NaN'
-        else:
-            step_length_mmss = 'NaN'
+        performed_step = log_step['description']
+        minutes = int(log_step['duration'] // 60)
+        seconds = int(log_step['duration'] % 60)
+        step_length_mmss = f"{minutes}:{seconds:02d}"
 
     los_issue_start_datetime = datetime.fromtimestamp(los_issue_start_time, tz=pytz.utc)
     los_issue_start_datetime = los_issue_start_datetime.astimezone(local_tz)
@@ -96,53 +98,119 @@ def collect_segment_info(
         'Length of step (mm:ss)': step_length_mmss,
         'Reason': ''
     }
-    date_time_str = f"{segment_data['Day']}_{segment_data['LOS Issue Start Time']}"
-
-    duplicate_exists = any(
-        (seg['Segment'] == segment_data['Segment']) and
-        (seg['Trial Number'] == segment_data['Trial Number']) and
-        (seg['Length (secs)'] == segment_data['Length (secs)']) and
-        (f"{seg['Day']}_{seg['LOS Issue Start Time']}" == date_time_str)
-        for seg in segment_info_list
-    )
+    if segment_keys is None:
+        segment_keys = {get_segment_key(seg) for seg in segment_info_list}
+    segment_key = get_segment_key(segment_data)
 
-    if duplicate_exists:
+    if segment_key in segment_keys:
         return
+    segment_keys.add(segment_key)
     segment_info_list.append(segment_data)
 
+def get_segment_key(segment_data):
+    """
+    Returns the key two segment information rows are considered duplicates by.
+
+    Parameters:
+        segment_data (dict): Segment information row.
+
+    Returns:
+        tuple: (Segment, Trial Number, Length, Day, LOS Issue Start Time)
+    """
+    return (
+        segment_data['Segment'],
+        segment_data['Trial Number'],
+        segment_data['Length (secs)'],
+        segment_data['Day'],
+        segment_data['LOS Issue Start Time']
+    )
+
 def generate_excel_table(segment_info_list, excel_output_path):
     """
-    Generates an Excel table from the segment information list.
-    If the Excel file already exists, it appends the new data to it.
+    Writes the segment information list to a formatted Excel table in a single pass.
+    An existing file is replaced, so the list has to contain all rows of the report.
 
     Parameters:
         segment_info_list (list): List of dictionaries containing segment information.
         excel_output_path (str): Path where the Excel file will be saved.
     """
-    new_df = pd.DataFrame(segment_info_list)
+    df = pd.DataFrame(segment_info_list)
 
-    if os.path.exists(excel_output_path):
-        existing_df = pd.read_excel(excel_output_path, engine='openpyxl')
-        df = pd.concat([existing_df, new_df], ignore_index=True)
-    else:
-        df = new_df
-    df.to_excel(excel_output_path, index=False, engine='openpyxl')
+    with pd.ExcelWriter(excel_output_path, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+        ws = next(iter(writer.sheets.values()))
+        for column_index, column_name in enumerate(df.columns, start=1):
+            if column_name in REPORT_COLUMN_WIDTHS:
+                ws.column_dimensions[get_column_letter(column_index)].width = REPORT_COLUMN_WIDTHS[column_name]
+
+def load_report_rows(excel_output_path):
+    """
+    Reads the segment information rows of an existing report, with the same value types as the rows
+    built by collect_segment_info.
 
-    wb = load_workbook(excel_output_path)
-    ws = wb.active
+    Parameters:
+        excel_output_path (str): Path of the Excel file.
 
-    column_letters = {cell.value: cell.column_letter for cell in ws[1]}
+    Returns:
+        list: The rows of the report, or an empty list if the file does not exist.
+    """
+    if not os.path.exists(excel_output_path):
+        return []
+    df = pd.read_excel(excel_output_path, engine='openpyxl', dtype=str, keep_default_na=False)
+    rows = df.to_dict('records')
+    for row in rows:
+        if 'Pretrial' in row:
+            row['Pretrial'] = row['Pretrial'] == 'True'
+        if 'Segment' in row and row['Segment'].isdigit():
+            row['Segment'] = int(row['Segment'])
+    return rows
+
+def create_segment_report(excel_output_path):
+    """
+    Creates a report sink that buffers the segment information rows of a whole run. The rows of an
+    existing report are loaded first, so rows of trials that are not processed in this run and
+    manually entered reasons are kept.
 
-    if 'Original Videos' in column_letters:
-        origin_video_column = column_letters['Original Videos']
-        ws.column_dimensions[origin_video_column].width = 45
+    Parameters:
+        excel_output_path (str): Path where the Excel file will be saved at the end of the run.
 
-    if 'Reason' in column_letters:
-        reason_column = column_letters['Reason']
-        ws.column_dimensions[reason_column].width = 60
+    Returns:
+        dict: The report with its 'path', buffered 'rows' and the row index of every segment key in 'keys'.
+    """
+    rows = load_report_rows(excel_output_path)
+    keys = {get_segment_key(row): index for index, row in enumerate(rows)}
+    return {'path': excel_output_path, 'rows': rows, 'keys': keys}
 
-    if 'Performed Step' in column_letters:
-        performed_step_column = column_letters['Performed Step']
-        ws.column_dimensions[performed_step_column].width = 45
+def add_report_rows(report, rows):
+    """
+    Adds the segment information rows of one trial to the report. A row whose segment is already in the
+    report replaces it, keeping the 'Reason' entered there.
 
-    wb.save(excel_output_path)
\ No newline at end of file
+    Parameters:
+        report (dict): Report created by create_segment_report.
+        rows (list): Segment information rows of the trial.
+    """
+    for row in rows:
+        segment_key = get_segment_key(row)
+        index = report['keys'].get(segment_key)
+        if index is None:
+            report['keys'][segment_key] = len(report['rows'])
+            report['rows'].append(row)
+        else:
+            reason = report['rows'][index].get('Reason', '')
+            report['rows'][index] = dict(row, Reason=row.get('Reason') or reason)
+
+def write_segment_report(report):
+    """
+    Writes all buffered rows of the report to the Excel file at once.
+
+    Parameters:
+        report (dict): Report created by create_segment_report.
+
+    Returns:
+        bool: True if the file was written, False if there were no rows.
+    """
+    if not report['rows']:
+        return False
+    generate_excel_table(report['rows'], report['path'])
+    return True
@@ -0,0 +1,251 @@
+import os
+import json
+import hashlib
+import logging
+from ..shared.config import (
+    TIMEFRAMES,
+    WINDOW_SIZE,
+    THRESHOLD_PERCENTAGE,
+    PHANTOM_WINDOW_SIZE,
+    PHANTOM_THRESHOLD_PERCENTAGE,
+    MIN_DURATION,
+    MAX_DURATION,
+    PADDING_SECONDS,
+    OVERLAY_DURATION,
+    OVERLAY_RENDERER,
+    FONT_FILE,
+    CUT_MODE,
+    COMPOSITE_VIDEO_TYPES,
+    COMPOSITE_TILE_WIDTH,
+    COMPOSITE_TILE_HEIGHT,
+    ENCODING_PROFILES,
+    ENCODING_PROFILE,
+    VIDEO_TYPE_ENCODING_PROFILES,
+    USE_PROXY_VIDEOS,
+    PROXY_VIDEO_TYPES,
+    PROXY_ENCODING_PROFILE
+)
+from ..shared.utils import file_fingerprint
+
+"""
+Per-trial manifests in the results directory that make re-runs incremental and crashed runs resumable.
+"""
+
+MANIFEST_DIR_NAME = 'manifest'
+
+def get_manifest_path(results_dir, trial_type, trial_number):
+    return os.path.join(results_dir, MANIFEST_DIR_NAME, f"{trial_type}_{trial_number}.json")
+
+def hash_json(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def fingerprint_files(file_paths):
+    """
+    Fingerprints files by name, size and modification time.
+
+    Parameters:
+        file_paths (list): Paths of the files.
+
+    Returns:
+        dict: {file_path: [size, mtime]} for every file that exists.
+    """
+    fingerprints = {}
+    for file_path in sorted(file_paths):
+        if os.path.isfile(file_path):
+            fingerprints[file_path] = list(file_fingerprint(file_path))
+    return fingerprints
+
+def get_config_fingerprint():
+    return {
+        'TIMEFRAMES': hash_json(TIMEFRAMES),
+        'WINDOW_SIZE': WINDOW_SIZE,
+        'THRESHOLD_PERCENTAGE': THRESHOLD_PERCENTAGE,
+        'PHANTOM_WINDOW_SIZE': PHANTOM_WINDOW_SIZE,
+        'PHANTOM_THRESHOLD_PERCENTAGE': PHANTOM_THRESHOLD_PERCENTAGE,
+        'MIN_DURATION': MIN_DURATION,
+        'MAX_DURATION': MAX_DURATION,
+        'PADDING_SECONDS': PADDING_SECONDS,
+        'OVERLAY_DURATION': OVERLAY_DURATION,
+        'OVERLAY_RENDERER': OVERLAY_RENDERER,
+        'FONT_FILE': FONT_FILE,
+        'CUT_MODE': CUT_MODE,
+        'COMPOSITE_VIDEO_TYPES': COMPOSITE_VIDEO_TYPES,
+        'COMPOSITE_TILE_WIDTH': COMPOSITE_TILE_WIDTH,
+        'COMPOSITE_TILE_HEIGHT': COMPOSITE_TILE_HEIGHT,
+        'ENCODING_PROFILES': hash_json(ENCODING_PROFILES),
+        'ENCODING_PROFILE': ENCODING_PROFILE,
+        'VIDEO_TYPE_ENCODING_PROFILES': VIDEO_TYPE_ENCODING_PROFILES,
+        'USE_PROXY_VIDEOS': USE_PROXY_VIDEOS,
+        'PROXY_VIDEO_TYPES': PROXY_VIDEO_TYPES,
+        'PROXY_ENCODING_PROFILE': PROXY_ENCODING_PROFILE
+    }
+
+def collect_trial_inputs(rosbag_dir, video_dir, video_files, log_file_dir, log_files):
+    """
+    Fingerprints everything a trial's outputs depend on.
+
+    Parameters:
+        rosbag_dir (str): Directory containing the rosbag files.
+        video_dir (str): Directory containing the video files.
+        video_files (list): List of video files for the trial.
+        log_file_dir (str): Directory containing the annotation logs, or None.
+        log_files (list): List of annotation log files.
+
+    Returns:
+        dict: Fingerprints of the bag, video and log files and of the relevant configuration.
+    """
+    bag_files = []
+    if os.path.isdir(rosbag_dir):
+        bag_files = [os.path.join(rosbag_dir, f) for f in os.listdir(rosbag_dir) if f.endswith('.bag')]
+    return {
+        'bags': fingerprint_files(bag_files),
+        'videos': fingerprint_files([os.path.join(video_dir, f) for f in video_files]),
+        'logs': fingerprint_files([os.path.join(log_file_dir, f) for f in log_files]) if log_file_dir else {},
+        'config': get_config_fingerprint()
+    }
+
+def load_manifest(manifest_path):
+    """
+    Loads a trial manifest.
+
+    Parameters:
+        manifest_path (str): Path to the manifest file.
+
+    Returns:
+        dict: The manifest, or an empty manifest if none exists yet or it is unreadable.
+    """
+    empty_manifest = {
+        'path': manifest_path,
+        'fingerprint': None,
+        'inputs': {},
+        'complete': False,
+        'outputs': {},
+        'failed_outputs': [],
+        'rows': []
+    }
+    if not os.path.exists(manifest_path):
+        return empty_manifest
+    try:
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return empty_manifest
+    manifest['path'] = manifest_path
+    return manifest
+
+def save_manifest(manifest):
+    """
+    Atomically writes a trial manifest to the path it was loaded from.
+
+    Parameters:
+        manifest (dict): The manifest to write.
+    """
+    manifest_path = manifest['path']
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump({key: value for key, value in manifest.items() if key != 'path'}, file, indent=1, default=str)
+    os.replace(temp_path, manifest_path)
+
+def is_trial_up_to_date(manifest, inputs):
+    """
+    Checks whether a trial finished with the same inputs and all of its outputs still exist.
+
+    Parameters:
+        manifest (dict): The trial manifest.
+        inputs (dict): Current inputs from collect_trial_inputs.
+
+    Returns:
+        bool: True if the trial can be skipped.
+    """
+    return (
+        manifest['complete']
+        and manifest['fingerprint'] == hash_json(inputs)
+        and all(os.path.exists(output_filename) for output_filename in manifest['outputs'])
+    )
+
+def start_trial(manifest, inputs):
+    """
+    Records the current inputs of a trial that is about to be (re)processed. Outputs recorded by an
+    earlier, interrupted run are kept so their segments can be skipped.
+
+    Parameters:
+        manifest (dict): The trial manifest.
+        inputs (dict): Current inputs from collect_trial_inputs.
+    """
+    manifest['fingerprint'] = hash_json(inputs)
+    manifest['inputs'] = inputs
+    manifest['complete'] = False
+    manifest['failed_outputs'] = []
+    manifest['rows'] = []
+    save_manifest(manifest)
+
+def fingerprint_job(commands, input_paths, job_files=None):
+    """
+    Fingerprints an encode job by its ffmpeg commands, the current state of its source videos and the
+    content of the files it writes for ffmpeg, such as the SRT with the overlays of the fast cut mode.
+
+    Parameters:
+        commands (list): The compiled ffmpeg command lines of the job.
+        input_paths (list): Paths of the source videos.
+        job_files (dict): {path: content} of the files written before the commands run.
+
+    Returns:
+        str: The job fingerprint.
+    """
+    job = {'commands': commands, 'inputs': fingerprint_files(input_paths)}
+    if job_files:
+        job['files'] = job_files
+    return hash_json(job)
+
+def is_output_current(manifest, output_filename, job_fingerprint):
+    recorded = manifest['outputs'].get(output_filename)
+    return (
+        recorded is not None
+        and recorded['fingerprint'] == job_fingerprint
+        and os.path.exists(output_filename)
+    )
+
+def record_output(manifest, output_filename, job_fingerprint, encoding_profile=None):
+    """
+    Records a finished output and persists the manifest right away, so a crashed run can resume.
+
+    Parameters:
+        manifest (dict): The trial manifest.
+        output_filename (str): Path of the finished output.
+        job_fingerprint (str): Fingerprint of the job that produced it.
+        encoding_profile (str): Name of the encoding profile the output was encoded with.
+    """
+    manifest['outputs'][output_filename] = {'fingerprint': job_fingerprint, 'encoding_profile': encoding_profile}
+    save_manifest(manifest)
+
+def forget_outputs(manifest, output_filenames):
+    """
+    Removes outputs that are about to be encoded again from the manifest, so a partial file left by an
+    encode that crashes or times out is never taken for a finished one.
+
+    Parameters:
+        manifest (dict): The trial manifest.
+        output_filenames (list): Paths of the outputs.
+    """
+    forgotten = [manifest['outputs'].pop(output_filename, None) for output_filename in output_filenames]
+    if any(recorded is not None for recorded in forgotten):
+        save_manifest(manifest)
+
+def record_failed_output(manifest, output_filename):
+    manifest['outputs'].pop(output_filename, None)
+    manifest.setdefault('failed_outputs', []).append(output_filename)
+
+def complete_trial(manifest, rows):
+    """
+    Marks a trial as finished and stores its report rows. A trial with failed outputs is not marked
+    complete, so the next run retries it.
+
+    Parameters:
+        manifest (dict): The trial manifest.
+        rows (list): Segment information rows produced for the trial.
+    """
+    manifest['complete'] = not manifest.get('failed_outputs')
+    manifest['rows'] = rows
+    save_manifest(manifest)
@@ -0,0 +1,336 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+import functools
+import ffmpeg
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from ..shared.config import OVERLAY_DURATION, FONT_FILE, OVERLAY_RENDERER, OVERLAY_CACHE_DIR
+from ..shared.utils import IntervalIndex, build_interval_index, overlapping_intervals, file_fingerprint
+
+OVERLAY_STYLES = {
+    'los': {
+        'x': '(w-text_w)/2',
+        'y': '(h-text_h)/2',
+        'fontsize': 60,
+        'fontcolor': 'white',
+        'boxcolor': 'black@0.75',
+        'bordercolor': 'white'
+    },
+    'phantom': {
+        'x': 10,
+        'y': 'h-text_h-10',
+        'fontsize': 40,
+        'fontcolor': 'yellow',
+        'boxcolor': 'black@0.5',
+        'bordercolor': 'yellow'
+    },
+    'label': {
+        'x': 10,
+        'y': 10,
+        'fontsize': 40,
+        'fontcolor': 'white',
+        'boxcolor': 'black@0.5',
+        'bordercolor': 'white'
+    }
+}
+
+def build_phantom_index(phantom_missing):
+    """
+    Merges the phantom missing segments into an interval index for fast overlap lookups.
+
+    Parameters:
+        phantom_missing (list): List of phantom missing segments as (start, end, label) tuples.
+
+    Returns:
+        IntervalIndex: Sorted, merged phantom missing intervals.
+    """
+    if isinstance(phantom_missing, IntervalIndex):
+        return phantom_missing
+    return build_interval_index([
+        (float(phantom_segment[0]), float(phantom_segment[1])) for phantom_segment in phantom_missing
+    ])
+
+def build_overlay_timeline(
+    segment_info,
+    phantom_missing,
+    los_issue_duration,
+    actual_padding_start,
+    actual_padding_end,
+    segment_duration
+):
+    """
+    Describes the annotations of a cut segment independently of how they are rendered.
+
+    Parameters:
+        segment_info (dict): Information about the current segment.
+        phantom_missing (list): List of phantom missing segments, or an index from build_phantom_index.
+            Overlapping and touching segments are merged and clipped to the cut segment.
+        los_issue_duration (float): Duration of the LOS issue.
+        actual_padding_start (float): Padding before the LOS issue within the segment.
+        actual_padding_end (float): Padding after the LOS issue within the segment.
+        segment_duration (float): Duration of the cut segment.
+
+    Returns:
+        list: Overlay dictionaries with 'text', 'style' and 'start'/'end' in seconds relative to the
+        segment start; 'start' and 'end' are None for overlays shown during the whole segment.
+    """
+    overlays = []
+    if actual_padding_start > 0:
+        overlays.append({
+            'text': 'LOS Problem start',
+            'style': 'los',
+            'start': actual_padding_start,
+            'end': actual_padding_start + OVERLAY_DURATION
+        })
+    if actual_padding_end > 0:
+        overlay_start = segment_duration - actual_padding_end
+        overlays.append({
+            'text': 'LOS Problem end',
+            'style': 'los',
+            'start': overlay_start,
+            'end': overlay_start + OVERLAY_DURATION
+        })
+
+    phantom_overlaps = overlapping_intervals(
+        segment_info['segment_start_time'],
+        segment_info['segment_end_time'],
+        build_phantom_index(phantom_missing)
+    )
+    for overlap_start, overlap_end in phantom_overlaps:
+        overlays.append({
+            'text': 'Phantom transforms missing',
+            'style': 'phantom',
+            'start': float(overlap_start) - segment_info['segment_start_time'],
+            'end': float(overlap_end) - segment_info['segment_start_time']
+        })
+
+    overlays.append({
+        'text': f'length: {los_issue_duration:.2f}',
+        'style': 'label',
+        'start': None,
+        'end': None
+    })
+    return overlays
+
+def group_overlays(overlays):
+    """
+    Groups the overlays that show the same text in the same style, so each label is rendered by a
+    single filter no matter how many time ranges it is shown in.
+
+    Parameters:
+        overlays (list): Overlays from build_overlay_timeline.
+
+    Returns:
+        list: (text, style, ranges) tuples in order of first appearance, where ranges is a list of
+        (start, end) tuples, or None if the label is shown during the whole segment.
+    """
+    grouped_overlays = {}
+    for overlay in overlays:
+        grouped_overlays.setdefault((overlay['text'], overlay['style']), []).append(overlay)
+
+    groups = []
+    for (text, style), label_overlays in grouped_overlays.items():
+        if any(overlay['start'] is None for overlay in label_overlays):
+            ranges = None
+        else:
+            ranges = [(overlay['start'], overlay['end']) for overlay in label_overlays]
+        groups.append((text, style, ranges))
+    return groups
+
+def build_enable_expression(ranges):
+    """
+    Builds an ffmpeg timeline expression that is true within any of the given ranges.
+
+    Parameters:
+        ranges (list): (start, end) tuples in seconds.
+
+    Returns:
+        str: The enable expression.
+    """
+    return '+'.join(f"between(t,{start},{end})" for start, end in ranges)
+
+def apply_drawtext_overlays(video_stream, overlays):
+    """
+    Burns the overlays into a video stream with one drawtext filter per label, using a compound
+    enable expression for labels shown in several time ranges.
+
+    Parameters:
+        video_stream: ffmpeg-python video stream.
+        overlays (list): Overlays from build_overlay_timeline.
+
+    Returns:
+        The filtered ffmpeg-python video stream.
+    """
+    for text, style, ranges in group_overlays(overlays):
+        drawtext_args = dict(OVERLAY_STYLES[style])
+        if ranges is not None:
+            drawtext_args['enable'] = build_enable_expression(ranges)
+        video_stream = video_stream.filter(
+            'drawtext',
+            text=text,
+            fontfile=FONT_FILE,
+            box=1,
+            borderw=2,
+            **drawtext_args
+        )
+    return video_stream
+
+def parse_overlay_color(color):
+    """
+    Converts an ffmpeg color such as 'black@0.75' to an RGBA tuple.
+
+    Parameters:
+        color (str): Color name or hex value, optionally followed by '@' and an opacity between 0 and 1.
+
+    Returns:
+        tuple: (red, green, blue, alpha)
+    """
+    name, _, opacity = color.partition('@')
+    alpha = int(round(float(opacity) * 255)) if opacity else 255
+    return ImageColor.getrgb(name)[:3] + (alpha,)
+
+@functools.lru_cache(maxsize=None)
+def load_overlay_font(fontsize):
+    """
+    Loads FONT_FILE for rendering overlay labels, falling back to Pillow's default font.
+
+    Parameters:
+        fontsize (int): Font size in pixels.
+
+    Returns:
+        tuple: (font, font_key) where font_key identifies the font that was actually loaded, including
+        the size and modification time of FONT_FILE, or is None for the default font.
+    """
+    try:
+        font = ImageFont.truetype(FONT_FILE, fontsize)
+    except OSError:
+        logging.warning(f"Font {FONT_FILE} not found, rendering overlays with the default font.")
+        return ImageFont.load_default(size=fontsize), None
+    try:
+        return font, [FONT_FILE, list(file_fingerprint(FONT_FILE))]
+    except OSError:
+        return font, [FONT_FILE]
+
+def render_overlay_image(text, style):
+    """
+    Rasterizes an overlay label once into a transparent PNG that looks like the drawtext version:
+    the text with its border on top of the semi-transparent box. Images are cached on disk by content
+    and by the font they were rendered with, so a fallback render is not reused once the font is found.
+
+    Parameters:
+        text (str): Text of the label.
+        style (str): Key of OVERLAY_STYLES.
+
+    Returns:
+        str: Path of the PNG file.
+    """
+    style_args = OVERLAY_STYLES[style]
+    font, font_key = load_overlay_font(style_args['fontsize'])
+    image_key = hashlib.sha1(
+        json.dumps([text, style_args, font_key], sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    image_path = os.path.join(OVERLAY_CACHE_DIR, f"{image_key}.png")
+    if os.path.exists(image_path):
+        return image_path
+
+    left, top, right, bottom = font.getbbox(text, stroke_width=2)
+    image = Image.new('RGBA', (right - left, bottom - top), parse_overlay_color(style_args['boxcolor']))
+    ImageDraw.Draw(image).text(
+        (-left, -top),
+        text,
+        font=font,
+        fill=parse_overlay_color(style_args['fontcolor']),
+        stroke_width=2,
+        stroke_fill=parse_overlay_color(style_args['bordercolor'])
+    )
+
+    os.makedirs(OVERLAY_CACHE_DIR, exist_ok=True)
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=OVERLAY_CACHE_DIR)
+    with os.fdopen(tmp_fd, 'wb') as file:
+        image.save(file, format='PNG')
+    os.replace(tmp_path, image_path)
+    return image_path
+
+def to_overlay_position(position):
+    """
+    Translates a drawtext position expression to the variable names of the overlay filter.
+
+    Parameters:
+        position: Position expression using w, h, text_w and text_h, or a number.
+
+    Returns:
+        str: The expression using W, H, w and h.
+    """
+    names = {'w': 'W', 'h': 'H', 'text_w': 'w', 'text_h': 'h'}
+    return re.sub(r'\b(text_w|text_h|w|h)\b', lambda match: names[match.group(1)], str(position))
+
+def apply_image_overlays(video_stream, overlays):
+    """
+    Composites pre-rendered overlay images onto a video stream, with one overlay filter per label.
+
+    Parameters:
+        video_stream: ffmpeg-python video stream.
+        overlays (list): Overlays from build_overlay_timeline.
+
+    Returns:
+        The filtered ffmpeg-python video stream.
+    """
+    for text, style, ranges in group_overlays(overlays):
+        overlay_args = {
+            'x': to_overlay_position(OVERLAY_STYLES[style]['x']),
+            'y': to_overlay_position(OVERLAY_STYLES[style]['y'])
+        }
+        if ranges is not None:
+            overlay_args['enable'] = build_enable_expression(ranges)
+        video_stream = video_stream.overlay(ffmpeg.input(render_overlay_image(text, style)), **overlay_args)
+    return video_stream
+
+def apply_overlays(video_stream, overlays, renderer=OVERLAY_RENDERER):
+    """
+    Burns the overlays into a video stream with the configured renderer.
+
+    Parameters:
+        video_stream: ffmpeg-python video stream.
+        overlays (list): Overlays from build_overlay_timeline.
+        renderer (str): 'drawtext' or 'png'.
+
+    Returns:
+        The filtered ffmpeg-python video stream.
+    """
+    if renderer == 'png':
+        return apply_image_overlays(video_stream, overlays)
+    return apply_drawtext_overlays(video_stream, overlays)
+
+def format_srt_time(seconds):
+    milliseconds = int(round(max(seconds, 0) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+def format_srt_file(overlays, segment_duration):
+    """
+    Formats the overlays as an SRT subtitle file instead of burning them into the video.
+
+    Parameters:
+        overlays (list): Overlays from build_overlay_timeline.
+        segment_duration (float): Duration of the cut segment.
+
+    Returns:
+        str: Content of the subtitle file.
+    """
+    cues = []
+    for overlay in overlays:
+        start = 0 if overlay['start'] is None else overlay['start']
+        end = segment_duration if overlay['end'] is None else min(overlay['end'], segment_duration)
+        if end > start:
+            cues.append((start, end, overlay['text']))
+    cues.sort(key=lambda cue: (cue[0], cue[1]))
+
+    return ''.join(
+        f"{index}\n{format_srt_time(start)} --> {format_srt_time(end)}\n{text}\n\n"
+        for index, (start, end, text) in enumerate(cues, start=1)
+    )
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import logging
+from ..shared.config import PROXY_VIDEO_TYPES, PROXY_ENCODING_PROFILE, PROXY_TIMEOUT, ENCODING_PROFILES
+from ..shared.utils import file_fingerprint
+from .cut_modes import build_proxy_command
+from .encoding import run_encode_jobs, remove_temporary_paths
+from .manifest import hash_json
+
+"""
+Downscaled proxies of the source videos, encoded once into a VideosProxy folder next to the video folder,
+so that review cuts do not have to decode the full-resolution sources.
+"""
+
+PROXY_DIR_NAME = 'VideosProxy'
+
+def get_proxy_dir(video_dir):
+    return os.path.join(os.path.dirname(os.path.normpath(video_dir)), PROXY_DIR_NAME)
+
+def get_proxy_info_path(proxy_path):
+    return f"{proxy_path}.json"
+
+def get_proxy_fingerprint(video_path, profile):
+    """
+    Fingerprints what a proxy is made from: its source video by size and modification time, and the
+    settings of the encoding profile.
+
+    Parameters:
+        video_path (str): Path of the source video.
+        profile (dict): Encoding profile from ENCODING_PROFILES.
+
+    Returns:
+        dict: The proxy fingerprint, stored in a JSON file next to the proxy.
+    """
+    return {'source': list(file_fingerprint(video_path)), 'profile': hash_json(profile)}
+
+def is_proxy_current(proxy_path, proxy_fingerprint):
+    info_path = get_proxy_info_path(proxy_path)
+    if not os.path.exists(proxy_path) or not os.path.exists(info_path):
+        return False
+    try:
+        with open(info_path, 'r') as file:
+            return json.load(file) == proxy_fingerprint
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable proxy info {info_path}: {e}")
+        return False
+
+def plan_proxies(video_dir, video_files, video_types=PROXY_VIDEO_TYPES, profile_name=PROXY_ENCODING_PROFILE):
+    """
+    Works out which proxies of a trial exist and which still have to be encoded.
+
+    Parameters:
+        video_dir (str): Directory containing the video files.
+        video_files (list): List of video files for the trial.
+        video_types (list): Video types that get a proxy.
+        profile_name (str): Profile from ENCODING_PROFILES the proxies are encoded with.
+
+    Returns:
+        tuple: (proxy_paths, pending) with {video_file: proxy_path} of the proxies that are up to date and
+        one dict per proxy to encode, holding its 'video_file', 'proxy_path', the 'partial_path' it is
+        encoded to, its 'fingerprint' and the ffmpeg 'commands'. A proxy is encoded again when its source
+        video or the profile settings changed.
+    """
+    proxy_dir = get_proxy_dir(video_dir)
+    profile = ENCODING_PROFILES[profile_name]
+    proxy_paths = {}
+    pending = []
+    for video_file in sorted(video_files):
+        if not any(video_type in video_file for video_type in video_types):
+            continue
+        video_path = os.path.join(video_dir, video_file)
+        proxy_path = os.path.join(proxy_dir, video_file)
+        proxy_fingerprint = get_proxy_fingerprint(video_path, profile)
+        if is_proxy_current(proxy_path, proxy_fingerprint):
+            proxy_paths[video_file] = proxy_path
+            continue
+        root, ext = os.path.splitext(proxy_path)
+        partial_path = f"{root}.partial{ext}"
+        pending.append({
+            'video_file': video_file,
+            'proxy_path': proxy_path,
+            'partial_path': partial_path,
+            'fingerprint': proxy_fingerprint,
+            'commands': [build_proxy_command(video_path, partial_path, profile)]
+        })
+    if pending:
+        os.makedirs(proxy_dir, exist_ok=True)
+    return proxy_paths, pending
+
+def finish_proxy(proxy_paths, proxy_job, result):
+    """
+    Moves a finished proxy into place, or cleans up after a failed one so its source is used instead.
+
+    Parameters:
+        proxy_paths (dict): {video_file: proxy_path} the proxy is added to on success.
+        proxy_job (dict): Pending proxy from plan_proxies.
+        result (tuple): (success, error_message) of the encode.
+    """
+    success, error = result
+    if success:
+        os.replace(proxy_job['partial_path'], proxy_job['proxy_path'])
+        try:
+            with open(get_proxy_info_path(proxy_job['proxy_path']), 'w') as file:
+                json.dump(proxy_job['fingerprint'], file)
+        except OSError as e:
+            logging.warning(f"Could not write proxy info for {proxy_job['proxy_path']}: {e}")
+        proxy_paths[proxy_job['video_file']] = proxy_job['proxy_path']
+        logging.info(f"Created proxy video: {proxy_job['proxy_path']}")
+    else:
+        remove_temporary_paths([proxy_job['partial_path']])
+        logging.error(f"Could not create proxy of {proxy_job['video_file']}, cutting from the source: {error}")
+
+def generate_proxies(video_dir, video_files):
+    """
+    Encodes the missing or outdated proxies of a trial on the encode worker pool. Proxy encodes cover
+    whole source videos, so they are limited by PROXY_TIMEOUT instead of the per-segment ENCODE_TIMEOUT.
+
+    Parameters:
+        video_dir (str): Directory containing the video files.
+        video_files (list): List of video files for the trial.
+
+    Returns:
+        dict: {video_file: proxy_path} of every video that has a proxy to cut from.
+    """
+    proxy_paths, pending = plan_proxies(video_dir, video_files)
+    if not pending:
+        return proxy_paths
+
+    def record_finished_proxy(index, result):
+        finish_proxy(proxy_paths, pending[index], result)
+
+    encoding_started = time.perf_counter()
+    run_encode_jobs(
+        [proxy_job['commands'] for proxy_job in pending], timeout=PROXY_TIMEOUT, on_complete=record_finished_proxy
+    )
+    logging.info(f"Encoded {len(pending)} proxy videos in {time.perf_counter() - encoding_started:.2f} s")
+    return proxy_paths
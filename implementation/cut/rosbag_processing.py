@@ -6,30 +6,71 @@ import pytz
 from datetime import datetime
 from bagpy import bagreader
 from ..shared.config import (
-    TIMEFRAMES,
     WINDOW_SIZE,
     THRESHOLD_PERCENTAGE,
     PHANTOM_WINDOW_SIZE,
     PHANTOM_THRESHOLD_PERCENTAGE,
-    MIN_DURATION
+    MIN_DURATION,
+    TELESCOPE_MARKER_FRAME_ID,
+    PHANTOM_MARKER_FRAME_ID,
+    USE_TRANSFORM_CACHE
 )
-from ..shared.utils import process_timeframes, is_within_timeframes
+from ..shared.utils import build_interval_index, within_intervals, overlapping_intervals
+from ..shared.timeframes import get_date_interval_index, get_all_interval_index
+from .transform_cache import load_cached_bag, store_cached_bag
 
 def get_overlapping_timeframes(segment_start, segment_end, timeframes):
-    overlaps = []
-    for start, end in timeframes:
-        overlap_start = max(segment_start, start)
-        overlap_end = min(segment_end, end)
-        if overlap_start < overlap_end:
-            overlaps.append((overlap_start, overlap_end))
-    return overlaps
+    return overlapping_intervals(segment_start, segment_end, build_interval_index(timeframes))
 
-def extract_marker_transforms(rosbag_folder, marker_frame_id):
-    all_timestamps = []
-    all_transforms = []
-    base_rosbag_output_dir = os.path.join(os.getcwd(), 'rosbag')
-    os.makedirs(base_rosbag_output_dir, exist_ok=True)
-    logging.info(f"Base directory for CSV files: {base_rosbag_output_dir}")
+AR_TRACKING_TOPIC = '/ARTracking'
+
+def stream_ar_tracking(b, marker_frame_ids):
+    times = {marker_frame_id: [] for marker_frame_id in marker_frame_ids}
+    transforms = {marker_frame_id: [] for marker_frame_id in marker_frame_ids}
+    for _, msg, t in b.reader.read_messages(topics=[AR_TRACKING_TOPIC]):
+        frame_id = msg.header.frame_id
+        if frame_id not in times:
+            continue
+        times[frame_id].append(t.secs + t.nsecs * 1e-9)
+        transforms[frame_id].append(msg.pose.position.x)
+    return {
+        marker_frame_id: (
+            np.array(times[marker_frame_id], dtype=np.float64),
+            np.array(transforms[marker_frame_id], dtype=np.float64)
+        )
+        for marker_frame_id in marker_frame_ids
+    }
+
+def read_ar_tracking_csv(b, rosbag_file, output_dir, marker_frame_ids):
+    os.makedirs(output_dir, exist_ok=True)
+    b.datafolder = output_dir
+    ar_tracking_data = b.message_by_topic(AR_TRACKING_TOPIC)
+    if not ar_tracking_data or not os.path.exists(ar_tracking_data):
+        logging.warning(f"No data found for /ARTracking in {rosbag_file}. Skipping this rosbag.")
+        return None
+    ar_tracking_df = pd.read_csv(ar_tracking_data, index_col=False)
+    if ar_tracking_df.empty:
+        logging.warning(f"Empty dataframe for /ARTracking in {rosbag_file}. Skipping this rosbag.")
+        return None
+    if 'header.frame_id' not in ar_tracking_df.columns:
+        logging.warning(f"'header.frame_id' column not found in {ar_tracking_data}. Skipping this rosbag.")
+        return None
+    if 'pose.position.x' not in ar_tracking_df.columns:
+        logging.warning(f"'pose.position.x' column not found in {ar_tracking_data}. Skipping this rosbag.")
+        return None
+    bag_transforms = {}
+    for marker_frame_id in marker_frame_ids:
+        marker_df = ar_tracking_df[ar_tracking_df['header.frame_id'] == marker_frame_id]
+        bag_transforms[marker_frame_id] = (
+            pd.to_numeric(marker_df['Time'], errors='coerce').to_numpy(dtype=np.float64),
+            pd.to_numeric(marker_df['pose.position.x'], errors='coerce').to_numpy(dtype=np.float64)
+        )
+    return bag_transforms
+
+def extract_markers_transforms(rosbag_folder, marker_frame_ids, scratch_dir=None, use_cache=USE_TRANSFORM_CACHE):
+    marker_frame_ids = list(dict.fromkeys(marker_frame_ids))
+    marker_chunks = {marker_frame_id: ([], []) for marker_frame_id in marker_frame_ids}
+    base_rosbag_output_dir = scratch_dir or os.path.join(os.getcwd(), 'rosbag')
     berlin_tz = pytz.timezone('Europe/Berlin')
     bag_files = [f for f in os.listdir(rosbag_folder) if f.endswith(".bag")]
     def parse_bag_datetime(fname):
@@ -39,99 +80,111 @@ def extract_marker_transforms(rosbag_folder, marker_frame_id):
         rosbag_path = os.path.join(rosbag_folder, rosbag_file)
         logging.info(f"Processing rosbag file: {rosbag_path}")
         try:
-            b = bagreader(rosbag_path)
-            bag_start_time = b.reader.get_start_time()
-            bag_end_time = b.reader.get_end_time()
+            cached_bag = load_cached_bag(rosbag_path, marker_frame_ids) if use_cache else None
+            if cached_bag is not None:
+                logging.info(f"Using cached transforms for {rosbag_file}")
+                bag_start_time, bag_end_time, bag_transforms = cached_bag
+            else:
+                b = bagreader(rosbag_path)
+                bag_start_time = b.reader.get_start_time()
+                bag_end_time = b.reader.get_end_time()
             bag_start_utc = datetime.utcfromtimestamp(bag_start_time).replace(tzinfo=pytz.utc)
             bag_end_utc = datetime.utcfromtimestamp(bag_end_time).replace(tzinfo=pytz.utc)
             bag_start_berlin = bag_start_utc.astimezone(berlin_tz)
             bag_end_berlin = bag_end_utc.astimezone(berlin_tz)
             bag_date_str = bag_start_berlin.strftime('%Y-%m-%d')
-            if bag_date_str not in TIMEFRAMES or not TIMEFRAMES[bag_date_str]:
+            date_interval_index = get_date_interval_index(bag_date_str)
+            if date_interval_index.starts.size == 0:
                 logging.info(f"No timeframes for date {bag_date_str}. Skipping this rosbag.")
                 continue
-            date_timeframes = {bag_date_str: TIMEFRAMES[bag_date_str]}
-            date_timeframes_processed = process_timeframes(date_timeframes)
-            earliest_start_time = min(start_time for start_time, _ in date_timeframes_processed)
-            latest_end_time = max(end_time for _, end_time in date_timeframes_processed)
+            earliest_start_time = date_interval_index.starts[0]
+            latest_end_time = date_interval_index.ends.max()
             if bag_end_berlin.timestamp() < earliest_start_time or bag_start_berlin.timestamp() > latest_end_time:
                 logging.info(f"Rosbag file {rosbag_file} does not overlap with the timeframe on {bag_date_str}. Skipping.")
                 continue
-            rosbag_name = os.path.splitext(rosbag_file)[0]
-            desired_output_dir = os.path.join(base_rosbag_output_dir, rosbag_name)
-            os.makedirs(desired_output_dir, exist_ok=True)
-            b.datafolder = desired_output_dir
-            if '/ARTracking' not in b.topics:
-                logging.warning(f"/ARTracking topic not found in {rosbag_file}. Skipping this rosbag.")
-                continue
-            ar_tracking_data = b.message_by_topic('/ARTracking')
-            if not ar_tracking_data or not os.path.exists(ar_tracking_data):
-                logging.warning(f"No data found for /ARTracking in {rosbag_file}. Skipping this rosbag.")
-                continue
-            ar_tracking_df = pd.read_csv(ar_tracking_data, index_col=False)
-            if ar_tracking_df.empty:
-                logging.warning(f"Empty dataframe for /ARTracking in {rosbag_file}. Skipping this rosbag.")
-                continue
-            if 'header.frame_id' not in ar_tracking_df.columns:
-                logging.warning(f"'header.frame_id' column not found in {ar_tracking_data}. Skipping this rosbag.")
-                continue
-            marker_df = ar_tracking_df[ar_tracking_df['header.frame_id'] == marker_frame_id]
-            if marker_df.empty:
-                logging.warning(f"No data found for marker '{marker_frame_id}' in {rosbag_file}. Skipping this rosbag.")
-                continue
-            marker_df = marker_df[pd.to_numeric(marker_df['Time'], errors='coerce').notnull()]
-            marker_df['Time'] = marker_df['Time'].astype(float)
-            marker_df.sort_values(by='Time', inplace=True)
-            marker_df = marker_df[marker_df['Time'].apply(lambda t: is_within_timeframes(t, date_timeframes_processed))]
-            if marker_df.empty:
-                logging.warning(f"No data within timeframes for marker '{marker_frame_id}' in {rosbag_file}. Skipping this rosbag.")
-                continue
-            if 'pose.position.x' not in marker_df.columns:
-                logging.warning(f"'pose.position.x' column not found in marker data from {rosbag_file}. Skipping this rosbag.")
-                continue
-            marker_df = marker_df[pd.to_numeric(marker_df['pose.position.x'], errors='coerce').notnull()]
-            marker_df['pose.position.x'] = marker_df['pose.position.x'].astype(float)
-            timestamps = marker_df['Time'].values
-            transforms = marker_df['pose.position.x'].values
-            all_timestamps.extend(timestamps)
-            all_transforms.extend(transforms)
+            if cached_bag is None:
+                if AR_TRACKING_TOPIC not in b.topics:
+                    logging.warning(f"/ARTracking topic not found in {rosbag_file}. Skipping this rosbag.")
+                    continue
+                try:
+                    bag_transforms = stream_ar_tracking(b, marker_frame_ids)
+                except Exception as e:
+                    logging.warning(f"Streaming /ARTracking from {rosbag_file} failed: {str(e)}. Falling back to CSV export.")
+                    rosbag_name = os.path.splitext(rosbag_file)[0]
+                    bag_transforms = read_ar_tracking_csv(
+                        b, rosbag_file, os.path.join(base_rosbag_output_dir, rosbag_name), marker_frame_ids
+                    )
+                    if bag_transforms is None:
+                        continue
+                if use_cache:
+                    store_cached_bag(rosbag_path, bag_start_time, bag_end_time, bag_transforms)
+            for marker_frame_id in marker_frame_ids:
+                timestamps, transforms = bag_transforms[marker_frame_id]
+                if timestamps.size == 0:
+                    logging.warning(f"No data found for marker '{marker_frame_id}' in {rosbag_file}. Skipping this marker.")
+                    continue
+                valid_time = ~np.isnan(timestamps)
+                timestamps = timestamps[valid_time]
+                transforms = transforms[valid_time]
+                order = np.argsort(timestamps, kind='stable')
+                timestamps = timestamps[order]
+                transforms = transforms[order]
+                in_timeframes = within_intervals(timestamps, date_interval_index)
+                timestamps = timestamps[in_timeframes]
+                transforms = transforms[in_timeframes]
+                if timestamps.size == 0:
+                    logging.warning(f"No data within timeframes for marker '{marker_frame_id}' in {rosbag_file}. Skipping this marker.")
+                    continue
+                valid_transform = ~np.isnan(transforms)
+                all_timestamps, all_transforms = marker_chunks[marker_frame_id]
+                all_timestamps.append(timestamps[valid_transform])
+                all_transforms.append(transforms[valid_transform])
         except Exception as e:
             logging.error(f"Error processing {rosbag_file}: {str(e)}. Skipping this rosbag.")
             continue
-    return all_timestamps, all_transforms
+    marker_transforms = {}
+    for marker_frame_id, (timestamp_chunks, transform_chunks) in marker_chunks.items():
+        marker_transforms[marker_frame_id] = (
+            np.concatenate(timestamp_chunks) if timestamp_chunks else np.empty(0, dtype=np.float64),
+            np.concatenate(transform_chunks) if transform_chunks else np.empty(0, dtype=np.float64)
+        )
+    return marker_transforms
 
-def identify_missing_segments(all_timestamps, all_transforms, window_size, threshold_percentage, timeframes):
-    threshold_missing = threshold_percentage / 100.0 * window_size
+def extract_marker_transforms(rosbag_folder, marker_frame_id):
+    return extract_markers_transforms(rosbag_folder, [marker_frame_id])[marker_frame_id]
+
+def count_missing_per_window(all_transforms, window_size):
+    missing = np.asarray(all_transforms) == 0
+    if window_size <= 0 or missing.size < window_size:
+        return np.empty(0, dtype=np.int64)
+    cumulative_missing = np.concatenate(([0], np.cumsum(missing, dtype=np.int64)))
+    return cumulative_missing[window_size:] - cumulative_missing[:-window_size]
+
+def find_flagged_runs(flags):
+    edges = np.diff(np.concatenate(([False], flags, [False])).astype(np.int8))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1) - 1
+    return run_starts, run_ends
+
+def runs_to_segments(all_timestamps, run_starts, run_ends, window_size, timeframes):
     segments = []
-    i = 0
-    total_points = len(all_timestamps)
-    while i <= total_points - window_size:
-        window_timestamps = all_timestamps[i:i + window_size]
-        window_transforms = all_transforms[i:i + window_size]
-        missing_count = np.sum(np.array(window_transforms) == 0)
-        if missing_count >= threshold_missing:
-            segment_start = window_timestamps[0]
-            segment_end = window_timestamps[window_size - 1]
-            j = i + 1
-            while j <= total_points - window_size:
-                next_window_timestamps = all_timestamps[j:j + window_size]
-                next_window_transforms = all_transforms[j:j + window_size]
-                next_missing_count = np.sum(np.array(next_window_transforms) == 0)
-                if next_missing_count >= threshold_missing:
-                    segment_end = next_window_timestamps[window_size - 1]
-                    j += 1
-                else:
-                    break
-            i = j
-            overlapping_timeframes = get_overlapping_timeframes(segment_start, segment_end, timeframes)
-            for overlap_start, overlap_end in overlapping_timeframes:
-                segment_duration = overlap_end - overlap_start
-                if segment_duration >= MIN_DURATION:
-                    segments.append((overlap_start, overlap_end, "merged"))
-        else:
-            i += 1
+    for run_start, run_end in zip(run_starts, run_ends):
+        segment_start = all_timestamps[run_start]
+        segment_end = all_timestamps[run_end + window_size - 1]
+        overlapping_timeframes = get_overlapping_timeframes(segment_start, segment_end, timeframes)
+        for overlap_start, overlap_end in overlapping_timeframes:
+            segment_duration = overlap_end - overlap_start
+            if segment_duration >= MIN_DURATION:
+                segments.append((overlap_start, overlap_end, "merged"))
     return segments
 
+def identify_missing_segments(all_timestamps, all_transforms, window_size, threshold_percentage, timeframes):
+    threshold_missing = threshold_percentage / 100.0 * window_size
+    all_timestamps = np.asarray(all_timestamps)
+    missing_counts = count_missing_per_window(all_transforms, window_size)
+    run_starts, run_ends = find_flagged_runs(missing_counts >= threshold_missing)
+    return runs_to_segments(all_timestamps, run_starts, run_ends, window_size, timeframes)
+
 def merge_segments(segments):
     if not segments:
         return []
@@ -147,21 +200,25 @@ def merge_segments(segments):
             merged_segments.append(current)
     return merged_segments
 
-def process_telescope_transforms(rosbag_folder):
-    timeframes = process_timeframes(TIMEFRAMES)
+def process_telescope_transforms(rosbag_folder, marker_transforms=None):
+    timeframes = get_all_interval_index()
     window_size = WINDOW_SIZE
     threshold_percentage = THRESHOLD_PERCENTAGE
-    all_timestamps, all_transforms = extract_marker_transforms(rosbag_folder, 'telescopeMarkerTransform')
+    if marker_transforms is None:
+        marker_transforms = extract_markers_transforms(rosbag_folder, [TELESCOPE_MARKER_FRAME_ID])
+    all_timestamps, all_transforms = marker_transforms[TELESCOPE_MARKER_FRAME_ID]
     segments = identify_missing_segments(all_timestamps, all_transforms, window_size, threshold_percentage, timeframes)
     merged_segments = merge_segments(segments)
     logging.info(f"Telescope segments: {merged_segments}")
     return merged_segments
 
-def process_phantom_transforms(rosbag_folder):
-    timeframes = process_timeframes(TIMEFRAMES)
+def process_phantom_transforms(rosbag_folder, marker_transforms=None):
+    timeframes = get_all_interval_index()
     window_size = PHANTOM_WINDOW_SIZE
     threshold_percentage = PHANTOM_THRESHOLD_PERCENTAGE
-    all_timestamps, all_transforms = extract_marker_transforms(rosbag_folder, 'phantomMarkerTransform')
+    if marker_transforms is None:
+        marker_transforms = extract_markers_transforms(rosbag_folder, [PHANTOM_MARKER_FRAME_ID])
+    all_timestamps, all_transforms = marker_transforms[PHANTOM_MARKER_FRAME_ID]
     segments = identify_missing_segments(all_timestamps, all_transforms, window_size, threshold_percentage, timeframes)
     merged_segments = merge_segments(segments)
     logging.info(f"Phantom segments: {merged_segments}")
@@ -0,0 +1,61 @@
+import numpy as np
+from .rosbag_processing import count_missing_per_window, runs_to_segments, merge_segments
+
+def sweep_missing_segments(all_timestamps, all_transforms, window_sizes, threshold_percentages, timeframes):
+    """
+    Runs identify_missing_segments followed by merge_segments for every combination of window size and
+    threshold. The missing counts are computed once per window size and all thresholds are applied to
+    them at once as a 2-D flag matrix.
+
+    Parameters:
+        all_timestamps (array-like): Timestamps of the marker.
+        all_transforms (array-like): Transforms of the marker, 0 where the marker was not tracked.
+        window_sizes (list): Window sizes to evaluate.
+        threshold_percentages (list): Threshold percentages to evaluate.
+        timeframes: Timeframes or IntervalIndex the segments are clipped to.
+
+    Returns:
+        dict: {(window_size, threshold_percentage): merged_segments}
+    """
+    all_timestamps = np.asarray(all_timestamps)
+    threshold_percentages = list(threshold_percentages)
+    results = {}
+    for window_size in window_sizes:
+        missing_counts = count_missing_per_window(all_transforms, window_size)
+        thresholds_missing = np.array(threshold_percentages, dtype=np.float64) / 100.0 * window_size
+        flags = missing_counts[np.newaxis, :] >= thresholds_missing[:, np.newaxis]
+        padded_flags = np.pad(flags, ((0, 0), (1, 1))).astype(np.int8)
+        edges = np.diff(padded_flags, axis=1)
+        start_rows, run_starts = np.nonzero(edges == 1)
+        end_rows, run_ends = np.nonzero(edges == -1)
+        run_ends = run_ends - 1
+        for row, threshold_percentage in enumerate(threshold_percentages):
+            segments = runs_to_segments(
+                all_timestamps,
+                run_starts[start_rows == row],
+                run_ends[end_rows == row],
+                window_size,
+                timeframes
+            )
+            results[(window_size, threshold_percentage)] = merge_segments(segments)
+    return results
+
+def summarize_sweep(sweep_results):
+    """
+    Reduces the segments of a sweep to their count and total duration.
+
+    Parameters:
+        sweep_results (dict): Output of sweep_missing_segments.
+
+    Returns:
+        list: Dictionaries with 'Window Size', 'Threshold (%)', 'Segments' and 'Total Duration (secs)'.
+    """
+    rows = []
+    for (window_size, threshold_percentage), segments in sweep_results.items():
+        rows.append({
+            'Window Size': window_size,
+            'Threshold (%)': threshold_percentage,
+            'Segments': len(segments),
+            'Total Duration (secs)': round(float(sum(end - start for start, end, _ in segments)), 2)
+        })
+    return rows
@@ -0,0 +1,95 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import numpy as np
+from ..shared.config import TRANSFORM_CACHE_DIR
+from ..shared.utils import file_fingerprint
+
+"""
+On-disk cache of the marker transforms extracted from each rosbag, stored as memory-mappable .npy files.
+"""
+
+BAG_INFO_FILE = 'bag.json'
+
+def hash_bag_file(rosbag_path):
+    """
+    Identifies a rosbag by its file name, size and modification time, without reading its content.
+
+    Parameters:
+        rosbag_path (str): Path to the rosbag file.
+
+    Returns:
+        str: Hex digest used as the cache key of the bag.
+    """
+    size, mtime = file_fingerprint(rosbag_path)
+    key = f"{os.path.basename(rosbag_path)}:{size}:{mtime}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def get_marker_cache_file(bag_cache_dir, marker_frame_id):
+    safe_marker = re.sub(r'[^A-Za-z0-9_.-]', '_', marker_frame_id)
+    return os.path.join(bag_cache_dir, f"{safe_marker}.npy")
+
+def load_cached_bag(rosbag_path, marker_frame_ids, cache_dir=TRANSFORM_CACHE_DIR):
+    """
+    Loads the cached transforms of a rosbag.
+
+    Parameters:
+        rosbag_path (str): Path to the rosbag file.
+        marker_frame_ids (list): Marker frame IDs that are needed.
+        cache_dir (str): Root directory of the transform cache.
+
+    Returns:
+        tuple: (bag_start_time, bag_end_time, {marker_frame_id: (times, transforms)}) with read-only
+        memory-mapped arrays, or None if the bag or one of the markers is not cached.
+    """
+    bag_cache_dir = os.path.join(cache_dir, hash_bag_file(rosbag_path))
+    info_path = os.path.join(bag_cache_dir, BAG_INFO_FILE)
+    if not os.path.exists(info_path):
+        return None
+    try:
+        with open(info_path, 'r') as file:
+            bag_info = json.load(file)
+        if not set(marker_frame_ids) <= set(bag_info['markers']):
+            return None
+        bag_transforms = {}
+        for marker_frame_id in marker_frame_ids:
+            marker_data = np.load(get_marker_cache_file(bag_cache_dir, marker_frame_id), mmap_mode='r')
+            bag_transforms[marker_frame_id] = (marker_data[0], marker_data[1])
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Ignoring unreadable transform cache for {rosbag_path}: {e}")
+        return None
+    return bag_info['start_time'], bag_info['end_time'], bag_transforms
+
+def store_cached_bag(rosbag_path, bag_start_time, bag_end_time, bag_transforms, cache_dir=TRANSFORM_CACHE_DIR):
+    """
+    Stores the transforms extracted from a rosbag, one (2, n) float64 array of times and transforms per marker.
+
+    Parameters:
+        rosbag_path (str): Path to the rosbag file.
+        bag_start_time (float): Start time of the bag.
+        bag_end_time (float): End time of the bag.
+        bag_transforms (dict): {marker_frame_id: (times, transforms)} as read from the bag.
+        cache_dir (str): Root directory of the transform cache.
+    """
+    bag_cache_dir = os.path.join(cache_dir, hash_bag_file(rosbag_path))
+    try:
+        os.makedirs(bag_cache_dir, exist_ok=True)
+        for marker_frame_id, (times, transforms) in bag_transforms.items():
+            marker_file = get_marker_cache_file(bag_cache_dir, marker_frame_id)
+            temp_file = f"{marker_file}.{os.getpid()}.tmp.npy"
+            np.save(temp_file, np.vstack((times, transforms)).astype(np.float64))
+            os.replace(temp_file, marker_file)
+        bag_info = {
+            'bag_file': os.path.basename(rosbag_path),
+            'start_time': bag_start_time,
+            'end_time': bag_end_time,
+            'markers': sorted(bag_transforms)
+        }
+        temp_info = os.path.join(bag_cache_dir, f"{BAG_INFO_FILE}.{os.getpid()}.tmp")
+        with open(temp_info, 'w') as file:
+            json.dump(bag_info, file, indent=1)
+        os.replace(temp_info, os.path.join(bag_cache_dir, BAG_INFO_FILE))
+    except OSError as e:
+        logging.warning(f"Could not cache transforms of {rosbag_path}: {e}")
@@ -1,24 +1,56 @@
 import os
+import time
 import ffmpeg
 import logging
 from datetime import datetime
 from dateutil import parser, tz
 import pytz
-from ..shared.config import MIN_DURATION, PADDING_SECONDS, OVERLAY_DURATION, FONT_FILE
-from ..shared.utils import find_log_step, unix_timestamp_to_seconds_since_midnight, parse_log_file
-from ..cut.generate_table import generate_excel_table, collect_segment_info
+from ..shared.config import MIN_DURATION, PADDING_SECONDS, CUT_MODE, ENCODE_TIMEOUT
+from ..shared.utils import find_log_step, unix_timestamp_to_seconds_since_midnight, parse_log_files, build_log_step_index
+from ..shared.metadata_cache import get_cached_metadata, store_metadata, save_metadata_cache
+from ..cut.generate_table import collect_segment_info
+from ..cut.encoding import run_encode_jobs, write_job_files, remove_temporary_paths, scale_timeout
+from ..cut.overlays import build_overlay_timeline, build_phantom_index
+from ..cut.manifest import fingerprint_job, is_output_current, forget_outputs, record_output, record_failed_output
+from ..cut.cut_modes import (
+    build_burn_in_command,
+    build_stream_copy_command,
+    build_hybrid_commands,
+    build_batch_command,
+    build_composite_command,
+    get_encoding_profile
+)
 
 def get_video_metadata(video_path):
     """
     Retrieves the duration and start timestamp of a video.
 
+    Results are served from the metadata cache while the file's size and modification time are
+    unchanged, so each file is only probed once.
+
     Parameters:
         video_path (str): Path to the video file.
 
     Returns:
         tuple: (duration, start_timestamp)
     """
-    probe = ffmpeg.probe(video_path)
+    metadata = get_cached_metadata(video_path)
+    if metadata is None:
+        metadata = parse_probe_metadata(video_path, ffmpeg.probe(video_path))
+        store_metadata(video_path, metadata)
+    return metadata['duration'], metadata['start_timestamp']
+
+def parse_probe_metadata(video_path, probe):
+    """
+    Extracts the duration and start timestamp from the ffprobe output of a video.
+
+    Parameters:
+        video_path (str): Path to the video file.
+        probe (dict): Parsed JSON output of ffprobe with the format section.
+
+    Returns:
+        dict: The metadata with 'duration', 'creation_time' and 'start_timestamp'.
+    """
     format_info = probe['format']
     tags = format_info.get('tags', {})
     creation_time_str = tags.get('creation_time')
@@ -27,9 +59,11 @@ def get_video_metadata(video_path):
     creation_time = parser.parse(creation_time_str)
     if creation_time.tzinfo is None:
         creation_time = creation_time.replace(tzinfo=tz.tzutc())
-    start_timestamp = creation_time.timestamp()
-    duration = float(format_info['duration'])
-    return duration, start_timestamp
+    return {
+        'duration': float(format_info['duration']),
+        'creation_time': creation_time_str,
+        'start_timestamp': creation_time.timestamp()
+    }
 
 
 def group_videos_by_start_time_and_type(video_files, video_dir):
@@ -200,19 +234,109 @@ def correlate_timestamp_with_video(segments, video_start_time, video_duration, v
         correlated_times.append(segment_info)
 
     return correlated_times
-def cut_video_segments(
+
+def plan_segment(segment_info, phantom_missing, log_steps, pretrial):
+    """
+    Plans everything about a cut segment that does not depend on the video type: padding, durations,
+    overlap with the phantom missing segments, log step and the overlay timeline. The Room, LapColor and
+    AtlasAR videos of the same wall-clock segment share one plan.
+
+    Parameters:
+        segment_info (dict): Information about the segment from correlate_timestamp_with_video.
+        phantom_missing (IntervalIndex): Phantom missing segments from build_phantom_index.
+        log_steps (LogStepIndex): Index of the parsed log steps, or None.
+        pretrial (bool): Indicates if it's a pretrial.
+
+    Returns:
+        dict: The segment plan with its LOS issue start time and duration, segment duration, overlays,
+        log step record and the parts of the output file name.
+    """
+    local_tz = pytz.timezone('Europe/Berlin')
+    los_issue_start_time = segment_info.get(
+        'los_issue_start_time',
+        segment_info['segment_start_time'] + PADDING_SECONDS
+    )
+    los_issue_end_time = segment_info.get(
+        'los_issue_end_time',
+        segment_info['segment_end_time'] - PADDING_SECONDS
+    )
+
+    actual_padding_start = los_issue_start_time - segment_info['segment_start_time']
+    actual_padding_end = segment_info['segment_end_time'] - los_issue_end_time
+
+    los_issue_duration = los_issue_end_time - los_issue_start_time
+
+    segment_duration = segment_info['segment_end_time'] - segment_info['segment_start_time']
+
+    overlays = build_overlay_timeline(
+        segment_info,
+        phantom_missing,
+        los_issue_duration,
+        actual_padding_start,
+        actual_padding_end,
+        segment_duration
+    )
+
+    start_time_str = datetime.fromtimestamp(segment_info['segment_start_time'], tz=local_tz).strftime('%H-%M-%S')
+
+    if log_steps and log_steps.steps and not pretrial:
+        los_issue_start_time_seconds = unix_timestamp_to_seconds_since_midnight(los_issue_start_time)
+        log_step = find_log_step(los_issue_start_time_seconds, log_steps)
+        if log_step is None:
+            log_step_label = "NoLogStep"
+        else:
+            log_step_label = log_step['description'].replace(" ", "_").replace(":", "-").replace("/", "-")
+    else:
+        log_step = None
+        log_step_label = "NoAnnotations"
+
+    return {
+        'los_issue_start_time': los_issue_start_time,
+        'los_issue_duration': los_issue_duration,
+        'segment_duration': segment_duration,
+        'overlays': overlays,
+        'log_step': log_step,
+        'log_step_label': log_step_label,
+        'start_time_str': start_time_str
+    }
+
+def build_input_parts(segment_info, video_dir, proxy_paths=None):
+    """
+    Works out which part of which video file covers the segment.
+
+    Parameters:
+        segment_info (dict): Information about the segment from correlate_timestamp_with_video.
+        video_dir (str): Directory containing the video files.
+        proxy_paths (dict): Optional {video_file: proxy_path}; video files with a proxy are read from it.
+
+    Returns:
+        list: (video_path, ss, duration) tuples in playback order.
+    """
+    input_parts = []
+    for vid_file, vid_start, vid_end in segment_info['video_inputs']:
+        vid_path = (proxy_paths or {}).get(vid_file) or os.path.join(video_dir, vid_file)
+        ss = max(segment_info['segment_start_time'] - vid_start, 0)
+        duration = min(segment_info['segment_end_time'], vid_end) - max(segment_info['segment_start_time'], vid_start)
+        if duration <= 0:
+            logging.warning(f"Invalid duration for video segment {vid_file}. Skipping.")
+            continue
+        input_parts.append((vid_path, ss, duration))
+    return input_parts
+
+def build_segment_jobs(
     segments,
     phantom_missing,
     video_dir,
     results_dir,
     trial_number,
-    LOG_FILE,
+    log_steps,
     VIDEO_FILES,
     pretrial,
-    trial_type
+    cut_mode=CUT_MODE,
+    proxy_paths=None
 ):
     """
-    Cuts video segments from given videos and adds overlays.
+    Plans the ffmpeg encodes for all video segments of a trial without running them.
 
     Parameters:
         segments (list): List of segments.
@@ -220,31 +344,36 @@ def cut_video_segments(
         video_dir (str): Directory containing the video files.
         results_dir (str): Directory for the output of the cut videos.
         trial_number (str): The trial number extracted from the directory name.
-        LOG_FILE (str): The concatenated log file content.
+        log_steps (LogStepIndex): Index of the parsed log steps, or None.
         VIDEO_FILES (list): List of video files for the current trial.
         pretrial (bool): Indicates if it's a pretrial.
-        trial_type (str): The trial type extracted from the directory name.
-    """
-    if LOG_FILE and not pretrial:
-        log_steps = parse_log_file(LOG_FILE)
-    else:
-        logging.warning("No log file found or pretrial data. Skipping log step annotations.")
-        log_steps = None
+        cut_mode (str): 'burn' to re-encode with burned-in overlays, 'fast' to stream-copy with a subtitle track,
+            'hybrid' to re-encode only around the overlays and stream-copy the rest, 'batch' to burn in with
+            one decode pass per source video, 'composite' to tile all video types of a segment into one clip
+            in a Composite folder.
+        proxy_paths (dict): Optional {video_file: proxy_path} of downscaled proxies to cut from instead of
+            the source videos; timing is still taken from the sources.
 
+    Returns:
+        list: List of job dictionaries in deterministic order, each holding the ffmpeg commands ('commands'),
+        the output file and the information needed to report the segment afterwards. In batch mode, jobs cut
+        from a single source video also carry 'batch_source' and 'batch_part', see group_encode_units. The
+        'encoding_profile' names the profile from ENCODING_PROFILES the output is encoded with.
+    """
     grouped_videos = group_videos_by_start_time_and_type(VIDEO_FILES, video_dir)
-    segment_info_list = []
+    jobs = []
+    segment_plans = {}
+    composite_events = {}
+    phantom_missing = build_phantom_index(phantom_missing)
 
     local_tz = pytz.timezone('Europe/Berlin')
 
-    created_directories = {}
-
     for start_time, videos_by_type in grouped_videos.items():
         folder_name = datetime.fromtimestamp(start_time, tz=local_tz).strftime('%Y-%m-%d_%H-%M-%S')
         base_output_dir = os.path.join(results_dir, f"Trial_{trial_number}", folder_name)
 
         for video_type, videos in videos_by_type.items():
             output_dir = os.path.join(base_output_dir, video_type)
-            created_directories[output_dir] = False  # Initially, the directory is empty
 
             for video_file in videos:
                 video_path = os.path.join(video_dir, video_file)
@@ -276,182 +405,366 @@ def cut_video_segments(
                     continue
 
                 for j, segment_info in enumerate(video_segments):
+                    output_filename = None
+                    if cut_mode == 'composite':
+                        event_key = (base_output_dir, segment_info['los_issue_start_time'], segment_info['los_issue_end_time'])
+                        composite_events.setdefault(event_key, []).append((video_type, j, segment_info))
+                        continue
                     try:
-                        los_issue_start_time = segment_info.get(
-                            'los_issue_start_time',
-                            segment_info['segment_start_time'] + PADDING_SECONDS
+                        plan_key = (
+                            segment_info['segment_start_time'],
+                            segment_info['segment_end_time'],
+                            segment_info['los_issue_start_time'],
+                            segment_info['los_issue_end_time']
                         )
-                        los_issue_end_time = segment_info.get(
-                            'los_issue_end_time',
-                            segment_info['segment_end_time'] - PADDING_SECONDS
-                        )
-
-                        actual_padding_start = los_issue_start_time - segment_info['segment_start_time']
-                        actual_padding_end = segment_info['segment_end_time'] - los_issue_end_time
-
-                        los_issue_duration = los_issue_end_time - los_issue_start_time
-
-                        segment_duration = segment_info['segment_end_time'] - segment_info['segment_start_time']
-
-                        inputs = []
-                        streams = []
-                        for _, (vid_file, vid_start, vid_end) in enumerate(segment_info['video_inputs']):
-                            vid_path = os.path.join(video_dir, vid_file)
-                            ss = max(segment_info['segment_start_time'] - vid_start, 0)
-                            duration = min(segment_info['segment_end_time'], vid_end) - max(segment_info['segment_start_time'], vid_start)
-                            if duration <= 0:
-                                logging.warning(f"Invalid duration for video segment {vid_file}. Skipping.")
-                                continue
-
-                            input_video = ffmpeg.input(vid_path, ss=ss, t=duration)
-                            inputs.append(input_video)
-                            streams.append(input_video)
-
-                        if not streams:
+                        if plan_key not in segment_plans:
+                            segment_plans[plan_key] = plan_segment(segment_info, phantom_missing, log_steps, pretrial)
+                        plan = segment_plans[plan_key]
+                        los_issue_start_time = plan['los_issue_start_time']
+                        los_issue_duration = plan['los_issue_duration']
+                        segment_duration = plan['segment_duration']
+                        overlays = plan['overlays']
+                        log_step = plan['log_step']
+
+                        input_parts = build_input_parts(segment_info, video_dir, proxy_paths)
+                        if not input_parts:
                             logging.warning(f"No valid video streams found for segment {j+1}. Skipping.")
                             continue
 
-                        if len(streams) > 1:
-                            video_concat = ffmpeg.concat(*streams, v=1, a=1).node
-                            video_stream = video_concat[0]
-                            audio_stream = video_concat[1]
-                        else:
-                            video_stream = streams[0]
-                            audio_stream = streams[0].audio
-
-                        video_stream = video_stream.filter('fps', fps=30)
-
-                        if actual_padding_start > 0:
-                            overlay_start = actual_padding_start
-                            overlay_end = overlay_start + OVERLAY_DURATION
-                            video_stream = video_stream.filter(
-                                'drawtext',
-                                text='LOS Problem start',
-                                enable=f'between(t,{overlay_start},{overlay_end})',
-                                x='(w-text_w)/2',
-                                y='(h-text_h)/2',
-                                fontsize=60,
-                                fontcolor='white',
-                                fontfile=FONT_FILE,
-                                box=1,
-                                boxcolor='black@0.75',
-                                borderw=2,
-                                bordercolor='white'
-                            )
-                        if actual_padding_end > 0:
-                            overlay_start = segment_duration - actual_padding_end
-                            overlay_end = overlay_start + OVERLAY_DURATION
-                            video_stream = video_stream.filter(
-                                'drawtext',
-                                text='LOS Problem end',
-                                enable=f'between(t,{overlay_start},{overlay_end})',
-                                x='(w-text_w)/2',
-                                y='(h-text_h)/2',
-                                fontsize=60,
-                                fontcolor='white',
-                                fontfile=FONT_FILE,
-                                box=1,
-                                boxcolor='black@0.75',
-                                borderw=2,
-                                bordercolor='white'
-                            )
-
-                        for phantom_segment in phantom_missing:
-                            phantom_start_time = float(phantom_segment[0])
-                            phantom_end_time = float(phantom_segment[1])
-
-                            if (phantom_end_time <= segment_info['segment_start_time']) or (phantom_start_time >= segment_info['segment_end_time']):
-                                continue
-                            overlap_start = max(phantom_start_time, segment_info['segment_start_time'])
-                            overlap_end = min(phantom_end_time, segment_info['segment_end_time'])
-                            overlay_start_time = overlap_start - segment_info['segment_start_time']
-                            overlay_end_time = overlap_end - segment_info['segment_start_time']
-
-                            video_stream = video_stream.filter(
-                                'drawtext',
-                                text='Phantom transforms missing',
-                                enable=f'between(t,{overlay_start_time},{overlay_end_time})',
-                                x=10,
-                                y='h-text_h-10',
-                                fontsize=40,
-                                fontcolor='yellow',
-                                fontfile=FONT_FILE,
-                                box=1,
-                                boxcolor='black@0.5',
-                                borderw=2,
-                                bordercolor='yellow'
-                            )
-
-                        formatted_duration = f"{los_issue_duration:.2f}"
-                        video_stream = video_stream.filter(
-                            'drawtext',
-                            text=f'length: {formatted_duration}',
-                            x=10,
-                            y=10,
-                            fontsize=40,
-                            fontcolor='white',
-                            fontfile=FONT_FILE,
-                            box=1,
-                            boxcolor='black@0.5',
-                            borderw=2,
-                            bordercolor='white'
-                        )
-                        start_time_str = datetime.fromtimestamp(segment_info['segment_start_time'], tz=local_tz).strftime('%H-%M-%S')
-
-                        if log_steps and not pretrial:
-                            los_issue_start_time_seconds = unix_timestamp_to_seconds_since_midnight(los_issue_start_time)
-                            log_step_description = find_log_step(los_issue_start_time_seconds, log_steps)
-                            if log_step_description is None:
-                                log_step_label = "NoLogStep"
-                            else:
-                                log_step_label = log_step_description.replace(" ", "_").replace(":", "-").replace("/", "-")
-                        else:
-                            log_step_description = ''
-                            log_step_label = "NoAnnotations"
-
                         output_filename = os.path.join(
                             output_dir,
-                            f'segment_{j+1}_{start_time_str}_{log_step_label}_{video_type}.mp4'
+                            f"segment_{j+1}_{plan['start_time_str']}_{plan['log_step_label']}_{video_type}.mp4"
                         )
 
                         # Ensure the directory exists before writing the output file
                         os.makedirs(os.path.dirname(output_filename), exist_ok=True)
 
-                        (
-                            ffmpeg
-                            .output(video_stream, audio_stream, output_filename, vcodec='libx264', acodec='aac', g=60)
-                            .run(quiet=True, overwrite_output=True)
-                        )
+                        profile_name, profile = get_encoding_profile(video_type)
+                        if cut_mode == 'fast':
+                            commands, temporary_paths, job_files = build_stream_copy_command(
+                                input_parts, overlays, segment_duration, output_filename
+                            )
+                            profile_name = 'stream copy'
+                        elif cut_mode == 'hybrid' and len(input_parts) == 1:
+                            commands, temporary_paths, job_files = build_hybrid_commands(
+                                input_parts[0], overlays, segment_duration, output_filename, profile
+                            )
+                            if profile.get('max_height'):
+                                logging.warning(
+                                    f"Hybrid mode keeps the source resolution, ignoring the max_height of "
+                                    f"profile '{profile_name}' for {output_filename}"
+                                )
+                                profile_name = f"{profile_name} (source resolution)"
+                        else:
+                            commands, temporary_paths, job_files = build_burn_in_command(
+                                input_parts, overlays, output_filename, profile
+                            )
 
-                        logging.info(f"Created video segment: {output_filename}")
-                        # Mark the directory as having content
-                        created_directories[output_dir] = True
+                        batch_job = {}
+                        if cut_mode == 'batch' and len(input_parts) == 1:
+                            vid_path, ss, duration = input_parts[0]
+                            batch_job = {
+                                'batch_source': vid_path,
+                                'batch_part': (ss, duration, overlays, output_filename),
+                                'batch_profile': profile
+                            }
 
                         segment_info['video_inputs'] = [
                             (vid_file.replace(video_type, '*'), vid_start, vid_end)
                             for vid_file, vid_start, vid_end in segment_info['video_inputs']
                         ]
 
-                        collect_segment_info(
-                            segment_info_list,
-                            segment_info,
-                            los_issue_duration,
-                            j,
-                            log_steps,
-                            log_step_description,
-                            los_issue_start_time,
-                            trial_number,
-                            pretrial,
-                            trial_type
-                        )
+                        jobs.append({
+                            'commands': commands,
+                            'temporary_paths': temporary_paths,
+                            'job_files': job_files,
+                            'input_paths': [vid_path for vid_path, _, _ in input_parts],
+                            'output_filename': output_filename,
+                            'segment_info': segment_info,
+                            'los_issue_duration': los_issue_duration,
+                            'segment_index': j,
+                            'log_step': log_step,
+                            'los_issue_start_time': los_issue_start_time,
+                            'encoding_profile': profile_name,
+                            **batch_job
+                        })
 
-                    except ffmpeg.Error as e:
-                        logging.error(f"FFmpeg Error for {output_filename}: {e.stderr.decode()}")
                     except Exception as e:
-                        logging.error(f"Unexpected error creating video segment {output_filename}: {e}")
-    if segment_info_list:
-        excel_output_path = os.path.join(results_dir, 'segment_info.xlsx')
-        generate_excel_table(segment_info_list, excel_output_path)
-        logging.info(f"Segment information written to Excel file: {excel_output_path}")
+                        logging.error(f"Unexpected error preparing video segment {output_filename}: {e}")
+
+    for (base_output_dir, _, _), type_segments in composite_events.items():
+        _, segment_index, first_segment_info = type_segments[0]
+        segment_info = dict(
+            first_segment_info,
+            segment_start_time=max(info['segment_start_time'] for _, _, info in type_segments),
+            segment_end_time=min(info['segment_end_time'] for _, _, info in type_segments)
+        )
+        output_filename = None
+        try:
+            plan_key = (
+                segment_info['segment_start_time'],
+                segment_info['segment_end_time'],
+                segment_info['los_issue_start_time'],
+                segment_info['los_issue_end_time']
+            )
+            if plan_key not in segment_plans:
+                segment_plans[plan_key] = plan_segment(segment_info, phantom_missing, log_steps, pretrial)
+            plan = segment_plans[plan_key]
+
+            type_parts = []
+            for video_type, _, type_segment_info in type_segments:
+                input_parts = build_input_parts(
+                    dict(
+                        type_segment_info,
+                        segment_start_time=segment_info['segment_start_time'],
+                        segment_end_time=segment_info['segment_end_time']
+                    ),
+                    video_dir,
+                    proxy_paths
+                )
+                if input_parts:
+                    type_parts.append((video_type, input_parts))
+            if not type_parts:
+                logging.warning(f"No valid video streams found for composite segment {segment_index+1}. Skipping.")
+                continue
+
+            output_filename = os.path.join(
+                base_output_dir,
+                'Composite',
+                f"segment_{segment_index+1}_{plan['start_time_str']}_{plan['log_step_label']}_Composite.mp4"
+            )
+            os.makedirs(os.path.dirname(output_filename), exist_ok=True)
+            profile_name, profile = get_encoding_profile('Composite')
+            commands, temporary_paths, job_files = build_composite_command(
+                type_parts, plan['overlays'], output_filename, profile
+            )
+
+            first_video_type = type_segments[0][0]
+            segment_info['video_inputs'] = [
+                (vid_file.replace(first_video_type, '*'), vid_start, vid_end)
+                for vid_file, vid_start, vid_end in segment_info['video_inputs']
+            ]
+
+            jobs.append({
+                'commands': commands,
+                'temporary_paths': temporary_paths,
+                'job_files': job_files,
+                'input_paths': [vid_path for _, input_parts in type_parts for vid_path, _, _ in input_parts],
+                'output_filename': output_filename,
+                'segment_info': segment_info,
+                'los_issue_duration': plan['los_issue_duration'],
+                'segment_index': segment_index,
+                'log_step': plan['log_step'],
+                'los_issue_start_time': plan['los_issue_start_time'],
+                'encoding_profile': profile_name
+            })
+        except Exception as e:
+            logging.error(f"Unexpected error preparing composite video segment {output_filename}: {e}")
+    return jobs
+
+def group_encode_units(jobs):
+    """
+    Groups the jobs into the ffmpeg runs that produce them. Jobs with the same 'batch_source' share a
+    single run that decodes the source video once; every other job is run on its own.
+
+    Parameters:
+        jobs (list): Jobs from build_segment_jobs.
+
+    Returns:
+        list: (commands, job_indexes) tuples in the order the jobs first appear.
+    """
+    encode_units = []
+    batches = {}
+    for index, job in enumerate(jobs):
+        if 'batch_source' not in job:
+            encode_units.append((job['commands'], [index]))
+            continue
+        if job['batch_source'] not in batches:
+            batches[job['batch_source']] = len(encode_units)
+            encode_units.append((None, []))
+        encode_units[batches[job['batch_source']]][1].append(index)
+
+    for batch_source, unit_index in batches.items():
+        job_indexes = encode_units[unit_index][1]
+        commands, _, _ = build_batch_command(
+            batch_source,
+            [jobs[index]['batch_part'] for index in job_indexes],
+            jobs[job_indexes[0]]['batch_profile']
+        )
+        encode_units[unit_index] = (commands, job_indexes)
+    return encode_units
+
+def plan_cut(
+    segments,
+    phantom_missing,
+    video_dir,
+    results_dir,
+    trial_number,
+    LOG_FILES,
+    VIDEO_FILES,
+    pretrial,
+    cut_mode=CUT_MODE,
+    manifest=None,
+    proxy_paths=None
+):
+    """
+    Plans all encodes of a trial and works out which of them still have to run.
+
+    Parameters:
+        See cut_video_segments.
+
+    Returns:
+        dict: The cut plan with the parsed 'log_steps', all 'jobs', the 'pending_jobs' that are not up to date,
+        the 'encode_units' that produce them, see group_encode_units, and the 'encode_timeouts' of the units.
+        A unit writing several segments gets ENCODE_TIMEOUT per segment.
+    """
+    if LOG_FILES and not pretrial:
+        log_steps = build_log_step_index(parse_log_files(LOG_FILES))
     else:
-        logging.info("No segment information to write to Excel.")
\ No newline at end of file
+        logging.warning("No log file found or pretrial data. Skipping log step annotations.")
+        log_steps = None
+
+    planning_started = time.perf_counter()
+    jobs = build_segment_jobs(
+        segments, phantom_missing, video_dir, results_dir, trial_number, log_steps, VIDEO_FILES, pretrial, cut_mode,
+        proxy_paths
+    )
+    save_metadata_cache()
+    logging.info(f"Planned {len(jobs)} video segments in {time.perf_counter() - planning_started:.2f} s")
+    pending_jobs = []
+    for job in jobs:
+        job['fingerprint'] = fingerprint_job(job['commands'], job['input_paths'], job['job_files'])
+        if manifest is not None and is_output_current(manifest, job['output_filename'], job['fingerprint']):
+            logging.info(f"Video segment is up to date, skipping: {job['output_filename']}")
+            job['result'] = (True, '')
+        else:
+            write_job_files(job['job_files'])
+            pending_jobs.append(job)
+    if manifest is not None:
+        forget_outputs(manifest, [job['output_filename'] for job in pending_jobs])
+
+    encode_units = group_encode_units(pending_jobs)
+    return {
+        'log_steps': log_steps,
+        'jobs': jobs,
+        'pending_jobs': pending_jobs,
+        'encode_units': encode_units,
+        'encode_timeouts': [scale_timeout(ENCODE_TIMEOUT, len(job_indexes)) for _, job_indexes in encode_units]
+    }
+
+def record_encoded_unit(cut_plan, index, result, manifest=None):
+    """
+    Stores the result of a finished encode unit on its jobs and records their outputs in the manifest.
+
+    Parameters:
+        cut_plan (dict): Cut plan from plan_cut.
+        index (int): Index of the unit in cut_plan['encode_units'].
+        result (tuple): (success, error_message) of the unit.
+        manifest (dict): Optional trial manifest.
+    """
+    success, _ = result
+    for job_index in cut_plan['encode_units'][index][1]:
+        job = cut_plan['pending_jobs'][job_index]
+        job['result'] = result
+        if manifest is None:
+            continue
+        if success:
+            record_output(manifest, job['output_filename'], job['fingerprint'], job['encoding_profile'])
+        else:
+            record_failed_output(manifest, job['output_filename'])
+
+def finish_cut(cut_plan, trial_number, pretrial, trial_type):
+    """
+    Cleans up after the encodes of a trial and collects the segment information of the created segments
+    in planning order.
+
+    Parameters:
+        cut_plan (dict): Cut plan from plan_cut whose encode units have all been recorded.
+        trial_number (str): The trial number extracted from the directory name.
+        pretrial (bool): Indicates if it's a pretrial.
+        trial_type (str): The trial type extracted from the directory name.
+
+    Returns:
+        list: The segment information rows of the trial.
+    """
+    segment_info_list = []
+    segment_keys = set()
+    for job in cut_plan['jobs']:
+        remove_temporary_paths(job['temporary_paths'])
+        success, error = job['result']
+        if not success:
+            logging.error(f"FFmpeg Error for {job['output_filename']}: {error}")
+            continue
+        logging.info(f"Created video segment: {job['output_filename']}")
+        collect_segment_info(
+            segment_info_list,
+            job['segment_info'],
+            job['los_issue_duration'],
+            job['segment_index'],
+            cut_plan['log_steps'],
+            job['log_step'],
+            job['los_issue_start_time'],
+            trial_number,
+            pretrial,
+            trial_type,
+            segment_keys
+        )
+    return segment_info_list
+
+def cut_video_segments(
+    segments,
+    phantom_missing,
+    video_dir,
+    results_dir,
+    trial_number,
+    LOG_FILES,
+    VIDEO_FILES,
+    pretrial,
+    trial_type,
+    cut_mode=CUT_MODE,
+    manifest=None,
+    proxy_paths=None
+):
+    """
+    Cuts video segments from given videos and adds overlays.
+
+    All encodes of the trial are planned first and then run on a bounded worker pool; the segment
+    information is still collected in planning order, and a failed encode does not stop the others.
+
+    Parameters:
+        segments (list): List of segments.
+        phantom_missing (list): List of phantom missing segments.
+        video_dir (str): Directory containing the video files.
+        results_dir (str): Directory for the output of the cut videos.
+        trial_number (str): The trial number extracted from the directory name.
+        LOG_FILES (list): Paths to the annotation log files of the trial, or None.
+        VIDEO_FILES (list): List of video files for the current trial.
+        pretrial (bool): Indicates if it's a pretrial.
+        trial_type (str): The trial type extracted from the directory name.
+        cut_mode (str): 'burn' to re-encode with burned-in overlays, 'fast' to stream-copy with a subtitle track,
+            'hybrid' to re-encode only around the overlays and stream-copy the rest, 'batch' to burn in with
+            one decode pass per source video, 'composite' to tile all video types of a segment into one clip.
+        manifest (dict): Optional trial manifest; segments it records as up to date are not encoded again,
+            and every finished segment is recorded in it right away.
+        proxy_paths (dict): Optional {video_file: proxy_path} of downscaled proxies from generate_proxies
+            to cut from instead of the source videos.
+
+    Returns:
+        list: The segment information rows of the trial.
+    """
+    cut_plan = plan_cut(
+        segments, phantom_missing, video_dir, results_dir, trial_number, LOG_FILES, VIDEO_FILES, pretrial,
+        cut_mode, manifest, proxy_paths
+    )
+
+    def record_finished_unit(index, result):
+        record_encoded_unit(cut_plan, index, result, manifest)
+
+    encoding_started = time.perf_counter()
+    run_encode_jobs(
+        [commands for commands, _ in cut_plan['encode_units']],
+        on_complete=record_finished_unit,
+        timeouts=cut_plan['encode_timeouts']
+    )
+    logging.info(f"Encoded {len(cut_plan['pending_jobs'])} video segments in {time.perf_counter() - encoding_started:.2f} s")
+    return finish_cut(cut_plan, trial_number, pretrial, trial_type)
@@ -6,7 +6,12 @@ Defines various configuration settings for file paths and processing parameters.
 
 CURRENT_DIRECTORY = os.getcwd()
 RESULTS_DIR_VID = os.path.join(CURRENT_DIRECTORY, 'cut_videos')
+METADATA_CACHE_FILE = os.path.join(RESULTS_DIR_VID, 'video_metadata_cache.json')
+TRANSFORM_CACHE_DIR = os.path.join(CURRENT_DIRECTORY, 'transform_cache')
+OVERLAY_CACHE_DIR = os.path.join(CURRENT_DIRECTORY, 'overlay_cache')
+USE_TRANSFORM_CACHE = True
 FONT_FILE = 'ARIAL.TTF'
+TIMEFRAMES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timeframes_timestamps.csv')
 
 def parse_trial_dir_name(trial_dir):
     parts = trial_dir.split('_')
@@ -112,7 +117,43 @@ PADDING_SECONDS = 1.5
 PHANTOM_THRESHOLD_PERCENTAGE = 80
 PHANTOM_WINDOW_SIZE = 60
 
+TELESCOPE_MARKER_FRAME_ID = 'telescopeMarkerTransform'
+PHANTOM_MARKER_FRAME_ID = 'phantomMarkerTransform'
+MARKER_FRAME_IDS = [TELESCOPE_MARKER_FRAME_ID, PHANTOM_MARKER_FRAME_ID]
+
 OVERLAY_DURATION = 0.5
+OVERLAY_RENDERER = 'drawtext' # 'drawtext' (render the text on every frame) or 'png' (rasterize each label once
+                              # and composite it with the overlay filter)
+
+CUT_MODE = 'burn' # 'burn' (re-encode with burned-in overlays), 'fast' (stream copy with a subtitle track),
+                  # 'hybrid' (re-encode only the GOPs around overlays, stream copy the rest),
+                  # 'batch' (burn in, but decode each source video once for all of its segments)
+                  # or 'composite' (one tiled clip with all video types per segment)
+
+COMPOSITE_VIDEO_TYPES = ['Room', 'LapColor', 'AtlasAR'] # tile order of the composite clips
+COMPOSITE_TILE_WIDTH = 640
+COMPOSITE_TILE_HEIGHT = 360
+
+# x264 settings of the re-encoded clips; max_height downscales the output (keeping the aspect ratio)
+ENCODING_PROFILES = {
+    'default': {'vcodec': 'libx264', 'acodec': 'aac', 'g': 60},
+    'review-fast': {'vcodec': 'libx264', 'acodec': 'aac', 'g': 60, 'preset': 'veryfast', 'crf': 28, 'max_height': 540},
+    'archive': {'vcodec': 'libx264', 'acodec': 'aac', 'g': 60, 'preset': 'slow', 'crf': 18},
+    'proxy': {'vcodec': 'libx264', 'acodec': 'aac', 'g': 30, 'preset': 'veryfast', 'crf': 23, 'max_height': 540}
+}
+ENCODING_PROFILE = 'default'
+VIDEO_TYPE_ENCODING_PROFILES = {} # per video type overrides, e.g. {'Room': 'review-fast', 'Composite': 'review-fast'}
+
+USE_PROXY_VIDEOS = False # cut from downscaled proxies in a VideosProxy folder next to the video folder
+PROXY_VIDEO_TYPES = ['Room', 'LapColor'] # video types that get a proxy, the others are cut from the source
+PROXY_ENCODING_PROFILE = 'proxy' # profile from ENCODING_PROFILES the proxies are encoded with
+PROXY_TIMEOUT = None # seconds per proxy encode of a whole source video, None to disable
+
+ENCODE_EXECUTOR = 'thread' # 'thread' or 'process'
+ENCODE_WORKERS = 4
+PROBE_WORKERS = 8 # concurrent ffprobe calls in --pipeline mode
+PLAN_WORKERS = 1 # trials detecting and planning segments at the same time in --pipeline mode
+ENCODE_TIMEOUT = 3600 # seconds per ffmpeg job, None to disable
 
 TIMEFRAMES = { #CET
     #Pre Trials:
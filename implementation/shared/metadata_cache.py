@@ -0,0 +1,117 @@
+import os
+import json
+import logging
+import threading
+from .config import METADATA_CACHE_FILE
+from .utils import file_fingerprint
+
+"""
+Persistent cache of probed video metadata and keyframe times, keyed by file path, size and modification time.
+"""
+
+_metadata_cache = {}
+_loaded_cache_files = set()
+_unsaved_cache_files = set()
+_cache_lock = threading.Lock()
+
+def _read_cache_file(cache_file):
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable metadata cache {cache_file}: {e}")
+        return {}
+
+def save_metadata_cache(cache_file=METADATA_CACHE_FILE):
+    """
+    Writes the in-memory metadata cache to disk, keeping entries other runs added in the meantime.
+    Nothing is written if no metadata was stored since the last save.
+
+    Parameters:
+        cache_file (str): Path to the JSON cache file.
+    """
+    with _cache_lock:
+        if cache_file not in _unsaved_cache_files:
+            return
+        _unsaved_cache_files.discard(cache_file)
+        entries = _read_cache_file(cache_file)
+        entries.update(_metadata_cache)
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            temp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w') as file:
+                json.dump(entries, file, indent=1)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            logging.warning(f"Could not write metadata cache {cache_file}: {e}")
+
+def get_cached_metadata(video_path, cache_file=METADATA_CACHE_FILE):
+    """
+    Looks up the metadata of a video without probing it.
+
+    Parameters:
+        video_path (str): Path to the video file.
+        cache_file (str): Path to the JSON cache file.
+
+    Returns:
+        dict: The cached metadata ('duration', 'creation_time', 'start_timestamp'), or None if the
+        file is not cached or has changed since it was probed.
+    """
+    return _get_cache_entry(os.path.abspath(video_path), video_path, cache_file)
+
+def store_metadata(video_path, metadata, cache_file=METADATA_CACHE_FILE):
+    """
+    Stores the metadata of a video in memory. It is written to disk by the next save_metadata_cache,
+    so probing many videos rewrites the cache file only once.
+
+    Parameters:
+        video_path (str): Path to the video file.
+        metadata (dict): The probed metadata to cache.
+        cache_file (str): Path to the JSON cache file.
+    """
+    _store_cache_entry(os.path.abspath(video_path), video_path, metadata, cache_file)
+
+def get_keyframes_key(video_path, start, end):
+    return f"{os.path.abspath(video_path)}#keyframes={start!r}%{end!r}"
+
+def get_cached_keyframes(video_path, start, end, cache_file=METADATA_CACHE_FILE):
+    """
+    Looks up the keyframe times of a video within a time range without scanning it.
+
+    Parameters:
+        video_path (str): Path to the video file.
+        start (float): Start of the range in seconds of the video.
+        end (float): End of the range in seconds of the video.
+        cache_file (str): Path to the JSON cache file.
+
+    Returns:
+        list: The cached keyframe times, or None if the range is not cached or the file has changed.
+    """
+    return _get_cache_entry(get_keyframes_key(video_path, start, end), video_path, cache_file)
+
+def store_keyframes(video_path, start, end, keyframes, cache_file=METADATA_CACHE_FILE):
+    _store_cache_entry(get_keyframes_key(video_path, start, end), video_path, keyframes, cache_file)
+
+def _get_cache_entry(key, video_path, cache_file):
+    with _cache_lock:
+        if cache_file not in _loaded_cache_files:
+            _metadata_cache.update(_read_cache_file(cache_file))
+            _loaded_cache_files.add(cache_file)
+        entry = _metadata_cache.get(key)
+    if entry is None:
+        return None
+    try:
+        size, mtime = file_fingerprint(video_path)
+    except OSError:
+        return None
+    if entry['size'] != size or entry['mtime'] != mtime:
+        return None
+    return entry['metadata']
+
+def _store_cache_entry(key, video_path, value, cache_file):
+    size, mtime = file_fingerprint(video_path)
+    with _cache_lock:
+        _metadata_cache[key] = {'size': size, 'mtime': mtime, 'metadata': value}
+        _unsaved_cache_files.add(cache_file)
@@ -0,0 +1,178 @@
+import os
+import csv
+import logging
+import numpy as np
+from .config import TIMEFRAMES, TIMEFRAMES_CSV
+from .utils import convert_to_timestamp, build_interval_index
+
+"""
+Registry of the recording timeframes, backed by the precomputed timeframes_timestamps.csv.
+"""
+
+TIMEFRAME_COLUMNS = ['Date', 'Start Time', 'End Time', 'Start Timestamp', 'End Timestamp']
+
+_timeframe_tables = {}
+
+def generate_timeframe_rows(timeframes):
+    """
+    Converts the configured timeframes into rows of the timeframe table.
+
+    Parameters:
+        timeframes (dict): Dictionary where keys are dates (YYYY-MM-DD), and values are lists of timeframes as strings in the format "start_time - end_time".
+
+    Returns:
+        list: List of row dictionaries with the columns of TIMEFRAME_COLUMNS.
+    """
+    rows = []
+    for date_str, time_ranges in timeframes.items():
+        for timeframe in time_ranges:
+            start_time, end_time = timeframe.split(' - ')
+            rows.append({
+                'Date': date_str,
+                'Start Time': start_time,
+                'End Time': end_time,
+                'Start Timestamp': convert_to_timestamp(start_time, reference_date=date_str),
+                'End Timestamp': convert_to_timestamp(end_time, reference_date=date_str)
+            })
+    return rows
+
+def read_timeframe_csv(csv_path):
+    """
+    Reads the timeframe table from a CSV file.
+
+    Parameters:
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        list: List of row dictionaries, or None if the file is missing or malformed.
+    """
+    if not os.path.exists(csv_path):
+        return None
+    try:
+        with open(csv_path, 'r', newline='') as file:
+            reader = csv.DictReader(file)
+            if reader.fieldnames != TIMEFRAME_COLUMNS:
+                logging.warning(f"Unexpected columns in {csv_path}: {reader.fieldnames}")
+                return None
+            return [
+                {
+                    'Date': row['Date'],
+                    'Start Time': row['Start Time'],
+                    'End Time': row['End Time'],
+                    'Start Timestamp': int(row['Start Timestamp']),
+                    'End Timestamp': int(row['End Timestamp'])
+                }
+                for row in reader
+            ]
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not read timeframe table {csv_path}: {e}")
+        return None
+
+def write_timeframe_csv(rows, csv_path):
+    """
+    Writes the timeframe table to a CSV file.
+
+    Parameters:
+        rows (list): List of row dictionaries with the columns of TIMEFRAME_COLUMNS.
+        csv_path (str): Path to the CSV file.
+    """
+    try:
+        with open(csv_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=TIMEFRAME_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    except OSError as e:
+        logging.warning(f"Could not write timeframe table {csv_path}: {e}")
+
+def load_timeframe_table(csv_path=TIMEFRAMES_CSV, timeframes=TIMEFRAMES):
+    """
+    Loads the timeframe table and serves it as per-date NumPy arrays.
+
+    The CSV is only trusted if its rows match the configured timeframes one to one; otherwise it is
+    regenerated from the configuration and written back. Inverted ranges (start after end) are logged
+    and left out of the served arrays.
+
+    Parameters:
+        csv_path (str): Path to the timeframe CSV file.
+        timeframes (dict): The configured timeframes, as in config.TIMEFRAMES.
+
+    Returns:
+        dict: {date: (start_timestamps, end_timestamps)} with float64 NumPy arrays in configuration order.
+    """
+    expected_keys = [
+        (date_str, *timeframe.split(' - '))
+        for date_str, time_ranges in timeframes.items()
+        for timeframe in time_ranges
+    ]
+    rows = read_timeframe_csv(csv_path)
+    if rows is None or [(row['Date'], row['Start Time'], row['End Time']) for row in rows] != expected_keys:
+        logging.info(f"Timeframe table {csv_path} is missing or out of date. Regenerating it from the config.")
+        rows = generate_timeframe_rows(timeframes)
+        write_timeframe_csv(rows, csv_path)
+
+    table = {date_str: ([], []) for date_str in timeframes}
+    for row in rows:
+        if row['Start Timestamp'] > row['End Timestamp']:
+            logging.warning(
+                f"Inverted timeframe on {row['Date']}: \"{row['Start Time']} - {row['End Time']}\". Ignoring it."
+            )
+            continue
+        starts, ends = table[row['Date']]
+        starts.append(row['Start Timestamp'])
+        ends.append(row['End Timestamp'])
+    return {
+        date_str: (np.array(starts, dtype=np.float64), np.array(ends, dtype=np.float64))
+        for date_str, (starts, ends) in table.items()
+    }
+
+def get_timeframe_table(csv_path=TIMEFRAMES_CSV):
+    """
+    Returns the timeframe table, loading it only on first use.
+
+    Parameters:
+        csv_path (str): Path to the timeframe CSV file.
+
+    Returns:
+        dict: {date: (start_timestamps, end_timestamps)}
+    """
+    if csv_path not in _timeframe_tables:
+        _timeframe_tables[csv_path] = load_timeframe_table(csv_path)
+    return _timeframe_tables[csv_path]
+
+def get_date_timeframes(date_str):
+    """
+    Returns the valid timeframes of a single date.
+
+    Parameters:
+        date_str (str): Date in the format YYYY-MM-DD.
+
+    Returns:
+        tuple: (start_timestamps, end_timestamps) as NumPy arrays, empty if the date has no timeframes.
+    """
+    empty = np.empty(0, dtype=np.float64)
+    return get_timeframe_table().get(date_str, (empty, empty))
+
+def get_date_interval_index(date_str):
+    """
+    Returns the interval index of a single date.
+
+    Parameters:
+        date_str (str): Date in the format YYYY-MM-DD.
+
+    Returns:
+        IntervalIndex: Sorted, merged timeframes of the date.
+    """
+    starts, ends = get_date_timeframes(date_str)
+    return build_interval_index(list(zip(starts, ends)))
+
+def get_all_interval_index():
+    """
+    Returns the interval index over the timeframes of all dates.
+
+    Returns:
+        IntervalIndex: Sorted, merged timeframes of all dates.
+    """
+    timeframes = []
+    for starts, ends in get_timeframe_table().values():
+        timeframes.extend(zip(starts, ends))
+    return build_interval_index(timeframes)
@@ -1,9 +1,17 @@
+import os
+import bisect
+import heapq
 import numpy as np
+from collections import namedtuple
 from datetime import datetime
 import re
 import subprocess
 import pytz
 
+IntervalIndex = namedtuple('IntervalIndex', ['starts', 'ends'])
+LogStepIndex = namedtuple('LogStepIndex', ['start_times', 'steps'])
+LOG_LINE_PATTERN = re.compile(r'\[(\d+)\]\[(\d{2}:\d{2}:\d{2}\.\d{3})\]\s*(.+)')
+
 def convert_to_timestamp(time_str, reference_date):
     """
     Converts a time string to a timestamp in UTC.
@@ -69,6 +77,19 @@ def get_video_metadata(video_dir):
     else:
         raise ValueError(f"Can't find metadata in: {video_dir}")
 
+def file_fingerprint(file_path):
+    """
+    Identifies the current state of a file without reading its content.
+
+    Parameters:
+        file_path (str): Path to the file.
+
+    Returns:
+        tuple: (size, mtime) with the size in bytes and the modification time in nanoseconds.
+    """
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
 def is_within_timeframes(timestamp, timeframes):
     """
     Checks if a given timestamp falls within any of the specified timeframes.
@@ -85,6 +106,77 @@ def is_within_timeframes(timestamp, timeframes):
             return True
     return False
 
+def build_interval_index(timeframes):
+    """
+    Builds a sorted index of non-overlapping intervals from a list of timeframes.
+
+    Overlapping or touching timeframes are merged, so every timestamp is covered by at most one interval.
+    Inverted timeframes (start after end) never match anything and are dropped.
+
+    Parameters:
+        timeframes (list): List of tuples containing start and end times.
+
+    Returns:
+        IntervalIndex: Sorted, merged start and end times as NumPy arrays.
+    """
+    if isinstance(timeframes, IntervalIndex):
+        return timeframes
+    if not timeframes:
+        return IntervalIndex(np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64))
+    bounds = np.array(timeframes, dtype=np.float64).reshape(-1, 2)
+    bounds = bounds[bounds[:, 0] <= bounds[:, 1]]
+    if bounds.size == 0:
+        return IntervalIndex(np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64))
+    bounds = bounds[np.argsort(bounds[:, 0], kind='stable')]
+    starts = [bounds[0, 0]]
+    ends = [bounds[0, 1]]
+    for start, end in bounds[1:]:
+        if start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return IntervalIndex(np.array(starts), np.array(ends))
+
+def within_intervals(timestamps, interval_index):
+    """
+    Checks for a whole array of timestamps whether each one falls within any interval of the index.
+
+    Parameters:
+        timestamps (array-like): Timestamps to check.
+        interval_index (IntervalIndex): Index built with build_interval_index.
+
+    Returns:
+        numpy.ndarray: Boolean mask, True where the timestamp is within an interval (bounds inclusive).
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    positions = np.searchsorted(interval_index.starts, timestamps, side='right') - 1
+    inside = positions >= 0
+    inside[inside] = timestamps[inside] <= interval_index.ends[positions[inside]]
+    return inside
+
+def overlapping_intervals(start_time, end_time, interval_index):
+    """
+    Clips the intervals of the index that overlap a given time range to that range.
+
+    Parameters:
+        start_time (float): Start of the time range.
+        end_time (float): End of the time range.
+        interval_index (IntervalIndex): Index built with build_interval_index.
+
+    Returns:
+        list: List of (overlap_start, overlap_end) tuples in ascending order.
+    """
+    first = np.searchsorted(interval_index.ends, start_time, side='right')
+    last = np.searchsorted(interval_index.starts, end_time, side='left')
+    overlaps = []
+    for start, end in zip(interval_index.starts[first:last], interval_index.ends[first:last]):
+        overlap_start = max(start_time, start)
+        overlap_end = min(end_time, end)
+        if overlap_start < overlap_end:
+            overlaps.append((overlap_start, overlap_end))
+    return overlaps
+
 def correlate_timestamp_with_video(segments, video_start_time, video_duration, min_duration):
     """
     Correlates the identified segments with the video timeline.
@@ -122,47 +214,92 @@ def correlate_timestamp_with_video(segments, video_start_time, video_duration, m
     print(f"Correlated times: {correlated_times}")
     return correlated_times
 
-def parse_log_file(log_content):
+def iter_log_entries(log_lines):
     """
-    Parses log content to extract steps with timestamps and descriptions.
+    Yields the annotated entries of a log line by line.
 
     Parameters:
-        log_content (str): Content of the log file as a string.
+        log_lines (iterable): Lines of a log, e.g. an open log file.
 
-    Returns:
-        list: A list of parsed steps with start time, end time, description, and timestamp.
+    Yields:
+        tuple: (timestamp, description) of every annotation line, with the timestamp in seconds.
     """
-    steps = []
-    current_step = None
-    local_tz = pytz.timezone('Europe/Berlin')
-
-    log_lines = log_content.strip().splitlines()
-
     for line in log_lines:
-        match = re.match(r'\[(\d+)\]\[(\d{2}:\d{2}:\d{2}\.\d{3})\]\s*(.+)', line)
+        match = LOG_LINE_PATTERN.match(line)
         if match:
             timestamp_ms_str, _, description = match.groups()
-            timestamp_ms = int(timestamp_ms_str)
-            timestamp = timestamp_ms / 1000.0 
+            yield int(timestamp_ms_str) / 1000.0, description.strip()
+
+def iter_log_file_entries(log_file_path):
+    """
+    Streams the annotated entries of a log file without reading the whole file into memory.
+
+    Parameters:
+        log_file_path (str): Path to the log file.
+
+    Yields:
+        tuple: (timestamp, description) of every annotation line, see iter_log_entries.
+    """
+    with open(log_file_path, 'r') as file:
+        yield from iter_log_entries(file)
+
+def iter_log_steps(entry_streams):
+    """
+    Merges several streams of log entries in timestamp order and turns them into steps.
+    Each step lasts until the next entry; the last one is given an hour.
+
+    Parameters:
+        entry_streams (list): Iterables of (timestamp, description) tuples, each in ascending order.
+
+    Yields:
+        dict: Steps with start time, end time, duration, description, and timestamp.
+    """
+    local_tz = pytz.timezone('Europe/Berlin')
+    current_step = None
 
-            dt = datetime.fromtimestamp(timestamp, tz=local_tz)
-            seconds_since_midnight = dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
+    for timestamp, description in heapq.merge(*entry_streams, key=lambda entry: entry[0]):
+        dt = datetime.fromtimestamp(timestamp, tz=local_tz)
+        seconds_since_midnight = dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
 
-            if current_step:
-                current_step['end_time'] = seconds_since_midnight
-                steps.append(current_step)
+        if current_step:
+            current_step['end_time'] = seconds_since_midnight
+            current_step['duration'] = current_step['end_time'] - current_step['start_time']
+            yield current_step
 
-            current_step = {
-                'start_time': seconds_since_midnight,
-                'description': description.strip(),
-                'timestamp': timestamp
-            }
+        current_step = {
+            'start_time': seconds_since_midnight,
+            'description': description,
+            'timestamp': timestamp
+        }
 
     if current_step:
         current_step['end_time'] = current_step['start_time'] + 3600
-        steps.append(current_step)
+        current_step['duration'] = 3600
+        yield current_step
 
-    return steps
+def parse_log_file(log_content):
+    """
+    Parses log content to extract steps with timestamps and descriptions.
+
+    Parameters:
+        log_content (str): Content of the log file as a string.
+
+    Returns:
+        list: A list of parsed steps with start time, end time, duration, description, and timestamp.
+    """
+    return list(iter_log_steps([iter_log_entries(log_content.strip().splitlines())]))
+
+def parse_log_files(log_file_paths):
+    """
+    Parses several log files into one list of steps, merged in timestamp order.
+
+    Parameters:
+        log_file_paths (list): Paths to the log files.
+
+    Returns:
+        list: A list of parsed steps with start time, end time, duration, description, and timestamp.
+    """
+    return list(iter_log_steps([iter_log_file_entries(path) for path in sorted(log_file_paths)]))
 
 def unix_timestamp_to_seconds_since_midnight(timestamp):
     """
@@ -179,22 +316,40 @@ def unix_timestamp_to_seconds_since_midnight(timestamp):
     seconds_since_midnight = dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
     return seconds_since_midnight
 
+def build_log_step_index(log_steps):
+    """
+    Builds an index of the parsed log steps sorted by start time for binary search lookups.
+
+    Parameters:
+        log_steps (list): List of log steps as returned by parse_log_files.
+
+    Returns:
+        LogStepIndex: The steps with an 'end_time', sorted by start time, and their start times.
+    """
+    if isinstance(log_steps, LogStepIndex):
+        return log_steps
+    steps = sorted(
+        (step for step in log_steps if step.get('end_time') is not None),
+        key=lambda step: step['start_time']
+    )
+    return LogStepIndex([step['start_time'] for step in steps], steps)
+
 def find_log_step(timestamp_seconds_since_midnight, log_steps):
     """
     Finds the log step that a timestamp falls into.
 
     Parameters:
         timestamp_seconds_since_midnight (float): The timestamp in seconds since midnight.
-        log_steps (list): List of log steps, each with 'start_time' and 'end_time'.
+        log_steps (LogStepIndex): Index built with build_log_step_index; a plain list of steps is indexed first.
 
     Returns:
-        str: The log step description, or None if not found.
+        dict: The full log step record including its 'duration', or None if not found.
     """
-    for step in log_steps:
-        start_time = step['start_time']
-        end_time = step.get('end_time', None)
-        if end_time is None:
-            continue
-        if start_time <= timestamp_seconds_since_midnight < end_time:
-            return step['description']
+    log_steps = build_log_step_index(log_steps)
+    position = bisect.bisect_right(log_steps.start_times, timestamp_seconds_since_midnight) - 1
+    if position < 0:
+        return None
+    step = log_steps.steps[position]
+    if timestamp_seconds_since_midnight < step['end_time']:
+        return step
     return None
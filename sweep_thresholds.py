@@ -0,0 +1,75 @@
+import os
+import shutil
+import argparse
+import logging
+import pandas as pd
+from implementation.shared.config import (
+    DATA_PATHS,
+    RESULTS_DIR_VID,
+    WINDOW_SIZE,
+    THRESHOLD_PERCENTAGE,
+    PHANTOM_WINDOW_SIZE,
+    PHANTOM_THRESHOLD_PERCENTAGE,
+    TELESCOPE_MARKER_FRAME_ID,
+    PHANTOM_MARKER_FRAME_ID
+)
+from implementation.shared.timeframes import get_all_interval_index
+from implementation.cut.rosbag_processing import extract_markers_transforms
+from implementation.cut.sweep import sweep_missing_segments, summarize_sweep
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="Evaluate the LOS detection for a grid of window sizes and thresholds without cutting any video."
+    )
+    arg_parser.add_argument('--window-sizes', type=int, nargs='+', default=[WINDOW_SIZE])
+    arg_parser.add_argument('--thresholds', type=float, nargs='+', default=[THRESHOLD_PERCENTAGE])
+    arg_parser.add_argument('--phantom-window-sizes', type=int, nargs='+', default=[PHANTOM_WINDOW_SIZE])
+    arg_parser.add_argument('--phantom-thresholds', type=float, nargs='+', default=[PHANTOM_THRESHOLD_PERCENTAGE])
+    arg_parser.add_argument(
+        '--output', default=os.path.join(RESULTS_DIR_VID, 'threshold_sweep.csv'),
+        help="CSV file the sweep table is written to"
+    )
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    timeframes = get_all_interval_index()
+    markers = [
+        (TELESCOPE_MARKER_FRAME_ID, args.window_sizes, args.thresholds),
+        (PHANTOM_MARKER_FRAME_ID, args.phantom_window_sizes, args.phantom_thresholds)
+    ]
+    scratch_dir = os.path.join(os.getcwd(), 'rosbag', 'sweep')
+
+    rows = []
+    for trial_data in DATA_PATHS:
+        if not os.path.exists(trial_data['ROSBAG_DATA_PATH']):
+            logging.warning(f"Rosbag directory {trial_data['ROSBAG_DATA_PATH']} does not exist. Skipping trial.")
+            continue
+        logging.info(f"Sweeping trial {trial_data['trial_number']}")
+        marker_transforms = extract_markers_transforms(
+            trial_data['ROSBAG_DATA_PATH'], [marker for marker, _, _ in markers], scratch_dir
+        )
+        for marker_frame_id, window_sizes, thresholds in markers:
+            all_timestamps, all_transforms = marker_transforms[marker_frame_id]
+            sweep_results = sweep_missing_segments(all_timestamps, all_transforms, window_sizes, thresholds, timeframes)
+            for row in summarize_sweep(sweep_results):
+                rows.append({
+                    'Trial': trial_data['trial_type'],
+                    'Trial Number': trial_data['trial_number'],
+                    'Marker': marker_frame_id,
+                    **row
+                })
+        if os.path.exists(scratch_dir):
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    sweep_df = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    sweep_df.to_csv(args.output, index=False)
+    logging.info(f"Sweep table written to {args.output}")
+    if not sweep_df.empty:
+        print(sweep_df.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
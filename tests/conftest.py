@@ -0,0 +1,11 @@
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# bagpy is only needed to read rosbags, which the tests never do
+try:
+    import bagpy
+except ImportError:
+    sys.modules['bagpy'] = types.SimpleNamespace(bagreader=None)
@@ -0,0 +1,15 @@
+from implementation.cut.cut_modes import plan_hybrid_parts
+
+def test_lead_in_is_reencoded_when_keyframes_start_before_the_segment():
+    overlays = [{'start': 5, 'end': 8, 'text': 'Phantom missing'}]
+    assert plan_hybrid_parts([-1.5, 2, 4, 6], overlays, 10) == [(0, 2, True), (2, 4, False), (4, 10, True)]
+
+def test_no_lead_in_when_a_keyframe_is_at_the_segment_start():
+    assert plan_hybrid_parts([0.0004, 2, 4, 6], [], 10) == [(0, 10, False)]
+
+def test_whole_segment_is_reencoded_without_keyframes():
+    assert plan_hybrid_parts([], [], 10) == [(0, 10, True)]
+
+def test_untimed_overlays_do_not_add_windows():
+    overlays = [{'start': None, 'end': None, 'text': 'Step 1'}]
+    assert plan_hybrid_parts([0, 3, 6], overlays, 9) == [(0, 9, False)]
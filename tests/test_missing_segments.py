@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from implementation.shared.config import MIN_DURATION
+from implementation.cut.rosbag_processing import get_overlapping_timeframes, identify_missing_segments
+
+def identify_missing_segments_reference(all_timestamps, all_transforms, window_size, threshold_percentage, timeframes):
+    # the original sliding-window loop, kept as the reference for the vectorized version
+    threshold_missing = threshold_percentage / 100.0 * window_size
+    segments = []
+    i = 0
+    total_points = len(all_timestamps)
+    while i <= total_points - window_size:
+        window_timestamps = all_timestamps[i:i + window_size]
+        window_transforms = all_transforms[i:i + window_size]
+        missing_count = np.sum(np.array(window_transforms) == 0)
+        if missing_count >= threshold_missing:
+            segment_start = window_timestamps[0]
+            segment_end = window_timestamps[window_size - 1]
+            j = i + 1
+            while j <= total_points - window_size:
+                next_window_timestamps = all_timestamps[j:j + window_size]
+                next_window_transforms = all_transforms[j:j + window_size]
+                next_missing_count = np.sum(np.array(next_window_transforms) == 0)
+                if next_missing_count >= threshold_missing:
+                    segment_end = next_window_timestamps[window_size - 1]
+                    j += 1
+                else:
+                    break
+            i = j
+            overlapping_timeframes = get_overlapping_timeframes(segment_start, segment_end, timeframes)
+            for overlap_start, overlap_end in overlapping_timeframes:
+                segment_duration = overlap_end - overlap_start
+                if segment_duration >= MIN_DURATION:
+                    segments.append((overlap_start, overlap_end, "merged"))
+        else:
+            i += 1
+    return segments
+
+@pytest.mark.parametrize('seed', range(300))
+def test_identify_missing_segments_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    total_points = int(rng.integers(0, 400))
+    all_timestamps = np.cumsum(rng.uniform(0.01, 0.2, total_points))
+    missing_rate = rng.uniform(0, 1)
+    all_transforms = np.where(rng.uniform(0, 1, total_points) < missing_rate, 0.0, rng.uniform(0.1, 1, total_points))
+    window_size = int(rng.integers(1, 80))
+    threshold_percentage = float(rng.choice([50, 70, 80, 90, 100]))
+    timeframes = [
+        (start, start + length)
+        for start, length in zip(rng.uniform(-5, 60, 3), rng.uniform(0, 40, 3))
+    ]
+
+    expected = identify_missing_segments_reference(
+        all_timestamps, all_transforms, window_size, threshold_percentage, timeframes
+    )
+    actual = identify_missing_segments(all_timestamps, all_transforms, window_size, threshold_percentage, timeframes)
+    assert actual == expected
+
+def test_identify_missing_segments_without_full_window():
+    assert identify_missing_segments(np.arange(5.0), np.zeros(5), 10, 90, [(0, 100)]) == []
@@ -0,0 +1,38 @@
+from implementation.cut.generate_table import create_segment_report, add_report_rows, write_segment_report
+
+def make_row(segment, trial_number='1', reason=''):
+    return {
+        'Pretrial': False,
+        'Trial': 'animal',
+        'Trial Number': trial_number,
+        'Original Videos': '2021_10_05-*_compressed.mp4',
+        'Segment': segment,
+        'Day': '05/10/2021',
+        'LOS Issue Start Time': '10:15:00',
+        'Length (secs)': '12.50',
+        'Performed Step': 'Dissection',
+        'Length of step (mm:ss)': '3:20',
+        'Reason': reason
+    }
+
+def test_existing_rows_and_reasons_are_kept(tmp_path):
+    excel_output_path = str(tmp_path / 'segment_info.xlsx')
+    report = create_segment_report(excel_output_path)
+    add_report_rows(report, [make_row(1), make_row(2), make_row(1, trial_number='2')])
+    assert write_segment_report(report)
+
+    first_run_rows = create_segment_report(excel_output_path)['rows']
+    assert first_run_rows == report['rows']
+
+    first_run_rows[0]['Reason'] = 'Instrument covers the marker'
+    report = create_segment_report(excel_output_path)
+    report['rows'] = first_run_rows
+    write_segment_report(report)
+
+    report = create_segment_report(excel_output_path)
+    add_report_rows(report, [make_row(1), make_row(3)])
+    write_segment_report(report)
+
+    rows = create_segment_report(excel_output_path)['rows']
+    assert [(row['Trial Number'], row['Segment']) for row in rows] == [('1', 1), ('1', 2), ('2', 1), ('1', 3)]
+    assert rows[0]['Reason'] == 'Instrument covers the marker'